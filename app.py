@@ -1,154 +1,323 @@
 # app.py
-import math
-from datetime import date
+import functools
+import importlib.util
 import json
-import requests
+import os
+import uuid
 import numpy as np
 import pandas as pd
 import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
-
-# --- map clicks (optional) ---
-try:
-    from streamlit_plotly_events import plotly_events
-    HAVE_PLOTLY_EVENTS = True
-except Exception:
-    HAVE_PLOTLY_EVENTS = False
+from core.sources import SyntheticSource, open_source
+from core.finance import annuity_monthly, principal_from_monthly, scenario_grid, sensitivity
+from core.metrics import (RENT_BEDROOM_COEFFS, LAYERS, HIGHER_IS_BAD,
+                          snapshot_layers, cap_gap)
+from core.stages import stage_args
+from core.trends import TrendStore
+from core.finder import AffordabilityIndex, price_ceiling, rent_ceiling
+from core.hierarchy import LEVELS, LEVEL_LABELS, Hierarchy
+from core.rollup import STAT_LABELS, STATS, Rollups, rollup_path
+from core.geometry import load_geometry
+from core.topology import Topology, level_for
+from core.figcache import FigureCache, digest, sizeof
+from core import spans
+from figures import (PTI_BANDS, RTI_BANDS, fig_from_json, fig_to_json, finder_timeline_fig, grid_code_at,
+                     map_grid_fig, map_real_fig, sensitivity_fig, tag_features, ts_fig)
+
+# --- map clicks (optional; the component is imported when a map is first drawn) ---
+HAVE_PLOTLY_EVENTS = importlib.util.find_spec("streamlit_plotly_events") is not None
 
 st.set_page_config(page_title="Housing Affordability — Sydney (SA2, synthetic)", layout="wide")
 
 # ---------- utils ----------
-def mulberry32(seed: int):
-    a = seed & 0xFFFFFFFF
-    def rnd():
-        nonlocal a
-        a = (a + 0x6D2B79F5) & 0xFFFFFFFF
-        t = (a ^ (a >> 15)) * (1 | a)
-        t = (t + ((t ^ (t >> 7)) * (61 | t))) ^ t
-        return ((t ^ (t >> 14)) & 0xFFFFFFFF) / 4294967296
-    return rnd
-
-def range_months(start: date, end: date):
-    months = []
-    y, m = start.year, start.month
-    while (y, m) <= (end.year, end.month):
-        months.append(date(y, m, 1))
-        m += 1
-        if m == 13:
-            m = 1; y += 1
-    return months
-
 def money(x):
     try: x = float(x)
     except: x = 0.0
     return f"A$ {int(round(x)):,.0f}"
 
-def color_scale_gyr(invert=False):
-    scale = [
-        [0.0, "rgb(0,128,0)"],
-        [0.5, "rgb(255,215,0)"],
-        [1.0, "rgb(220,20,60)"]
-    ]
-    return list(reversed(scale)) if invert else scale
-
-def annuity_monthly(L, r_annual, years):
-    L = max(0.0, float(L)); m = float(r_annual)/12.0; n = max(1, int(round(years*12)))
-    if L == 0: return 0.0
-    if m == 0: return L / n
-    return (m*L) / (1 - (1+m)**(-n))
-
-def principal_from_monthly(payment, r_annual, years):
-    m = float(r_annual)/12.0; n = max(1, int(round(years*12)))
-    if m == 0: return float(payment)*n
-    return float(payment) * (1 - (1+m)**(-n)) / m
-
-RENT_BEDROOM_COEFFS = {1:1.00, 2:1.35, 3:1.75}
-PRICE_BEDROOM_COEFFS = {1:0.85, 2:1.00, 3:1.25}
-
-# ---------- synthetic series (12 SA2) ----------
-@st.cache_data
-def load_synthetic():
-    rng = mulberry32(20250926)
-    sa2 = [f"SA2_{i:02d}" for i in range(1,13)]
-    months = range_months(date(2015,1,1), date(2025,9,1))
-    rows = []
-    for code in sa2:
-        price = 650000 + rng()*950000
-        rent  = 420 + rng()*480
-        income= 70000 + rng()*55000
-        gp = 0.0018 + (rng()-0.5)*0.0008
-        gr = 0.0012 + (rng()-0.5)*0.0006
-        gi = 0.0009 + (rng()-0.5)*0.0005
-        for t, dt in enumerate(months):
-            seas = 1 + 0.02*math.sin(2*math.pi*(t%12)/12)
-            price *= 1 + gp + max(-0.003, min(0.003, (rng()-0.5)*0.002))
-            rent  *= 1 + gr + max(-0.002, min(0.002, (rng()-0.5)*0.0016))
-            income*= 1 + gi + max(-0.0015, min(0.0015, (rng()-0.5)*0.0012))
-            P  = max(250000, price*seas + (rng()-0.5)*24000)
-            Rw = max(250,    rent*seas  + (rng()-0.5)*16)
-            I  = max(40000,  income*(0.995+(rng()-0.5)*0.004))
-            rows.append(dict(date=dt.strftime("%Y-%m"), SA2_CODE=code,
-                             MedianPrice=P, MedianRent_week=Rw, MedianIncome_annual=I))
-    df = pd.DataFrame(rows)
-    # 3x4 grid positions
-    grid = pd.DataFrame({
-        "SA2_CODE": sa2,
-        "row": [0,0,0,0, 1,1,1,1, 2,2,2,2],
-        "col": [0,1,2,3, 0,1,2,3, 0,1,2,3]
-    })
-    return df, grid, months
+# ---------- rerun timing spans (core.spans) ----------
+# Traced when the sidebar "Show timings" box is on or SPANS_EXPORT is set: "*.jsonl" appends one
+# line per rerun, any other path holds per-stage Prometheus histograms. Off, spans are no-ops.
+SPANS_EXPORT = os.environ.get("SPANS_EXPORT", "")
+
+@st.cache_resource
+def span_exporter():
+    return spans.SpanExporter(SPANS_EXPORT) if SPANS_EXPORT else None
+
+def tracing_on():
+    return bool(SPANS_EXPORT) or st.session_state.get("debug_spans", False)
+
+def trace_meta(kind):
+    if "trace_session" not in st.session_state:
+        st.session_state.trace_session = uuid.uuid4().hex[:12]
+    return {"session": st.session_state.trace_session, "kind": kind}
+
+def traced(name):
+    """Run the body in span ``name``; a fragment rerunning alone is traced as its own run."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            on = tracing_on()
+            with spans.scope(name, on, span_exporter(), **(trace_meta("fragment") if on else {})):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+# ---------- panel data ----------
+# PANEL_SOURCE: "synthetic" (default) or a partitioned Parquet / Arrow IPC path (core.sources);
+# PANEL_SA2 (comma-separated codes) and PANEL_START (YYYY-MM) are pushed down into the scan.
+PANEL_SOURCE = os.environ.get("PANEL_SOURCE", "synthetic")
+PANEL_SA2 = [c for c in os.environ.get("PANEL_SA2", "").split(",") if c] or None
+PANEL_START = os.environ.get("PANEL_START") or None
+
+@st.cache_resource
+def load_synthetic(n_sa2=12, freq="M"):
+    return SyntheticSource(n_sa2=n_sa2, freq=freq)
+
+@st.cache_resource
+def load_source(spec=PANEL_SOURCE):
+    return load_synthetic() if spec == "synthetic" else open_source(spec)
+
+# shared across sessions without copying; slices of it are views
+@st.cache_resource
+def load_cube():
+    spans.annotate(cache="miss")
+    return load_source().cube(sa2=PANEL_SA2, start=PANEL_START)
+
+# ---------- regional rollups (SA3 / SA4 / GCCSA) ----------
+# SA2_HIERARCHY: ABS allocation file (CSV/Parquet), SA2_WEIGHT its column to weight SA2s by; without
+# it synthetic codes are grouped by grid blocks. Rollups are stored beside the panel and brought up
+# to date for new or revised months only (core.rollup); restricted views are kept in memory.
+SA2_HIERARCHY = os.environ.get("SA2_HIERARCHY", "")
+SA2_WEIGHT = os.environ.get("SA2_WEIGHT") or None
+
+@st.cache_resource
+def load_hierarchy():
+    spans.annotate(cache="miss")
+    if SA2_HIERARCHY:
+        return Hierarchy.read(SA2_HIERARCHY, SA2_WEIGHT)
+    return Hierarchy.synthetic(load_cube().codes)
+
+@st.cache_resource
+def load_rollups():
+    spans.annotate(cache="miss")
+    path = None if PANEL_SA2 or PANEL_START else rollup_path(PANEL_SOURCE)
+    return Rollups.open(path, load_cube(), load_hierarchy())
 
 # ---------- real SA2 polygons (auto-load) ----------
-# ABS ASGS 2021 → SA2 (FeatureServer), returns GeoJSON with the needed fields.
-ABS_QUERY = (
-    "https://geo.abs.gov.au/arcgis/rest/services/ASGS2021/SA2/FeatureServer/0/query"
-    "?f=geojson"
-    "&where=gccsa_name_2021%3D%27Greater%20Sydney%27"
-    "&outFields=sa2_code_2021,sa2_name_2021"
-    "&outSR=4326"
-    "&geometryPrecision=5"
-)
-
-GITHUB_FALLBACK = "https://raw.githubusercontent.com/centreborelli/geo-aus/master/ABS/2016/SA2/sa2_2016_sydney_simplified.geojson"
-
-@st.cache_data(ttl=24*3600)
-def load_sa2_geojson(max_features=15):
-    # 1) ABS ArcGIS (Greater Sydney)
-    try:
-        r = requests.get(ABS_QUERY, timeout=15)
-        if r.ok:
-            gj = r.json()
-            if isinstance(gj, dict) and gj.get("features"):
-                feats = sorted(gj["features"], key=lambda f: f.get("properties",{}).get("sa2_name_2021",""))[:max_features]
-                gj = {"type":"FeatureCollection","features":feats}
-                return gj, "abs"
-    except Exception:
-        pass
-    # 2) GitHub fallback (simplified Sydney contours)
-    try:
-        r = requests.get(GITHUB_FALLBACK, timeout=15)
-        if r.ok:
-            gj = r.json()
-            if isinstance(gj, dict) and gj.get("features"):
-                feats = gj["features"][:max_features]
-                gj = {"type":"FeatureCollection","features":feats}
-                return gj, "github"
-    except Exception:
-        pass
-    return None, "none"
+# Disk store first, then ABS ArcGIS / GitHub / SA2_GEOJSON raced concurrently (core.geometry).
+# Held as a resource: the full collection is shared, never copied per rerun. Each load gets a new
+# version, so what is derived from the geometry is rebuilt when it is refreshed.
+@st.cache_resource(ttl=24*3600)
+def load_sa2_geojson():
+    spans.annotate(cache="miss")
+    gj, source = load_geometry()
+    return gj, source, uuid.uuid4().hex
+
+# arcs and simplified levels are built once per geometry version
+@st.cache_resource(max_entries=2)
+def load_topology(version, _gj):
+    spans.annotate(cache="miss")
+    return Topology.from_geojson(_gj)
+
+# ---------- cached stages (memoized on exactly their inputs, see core.stages) ----------
+@st.cache_data(max_entries=16)
+def stage_snapshot(bedrooms):
+    spans.annotate(cache="miss")
+    return snapshot_layers(load_cube(), bedrooms)
+
+@st.cache_data(max_entries=64)
+def stage_cap_gap(bedrooms, deposit_pct, interest, max_monthly):
+    spans.annotate(cache="miss")
+    return cap_gap(stage_snapshot(bedrooms).columns["MedianPrice_adj"], deposit_pct, interest, max_monthly)
+
+def stage_layers(bedrooms, deposit_pct=None, interest=None, max_monthly=None):
+    with spans.span("snapshot", cache="hit"):
+        layers = stage_snapshot(bedrooms)
+    if deposit_pct is None:
+        return layers
+    with spans.span("cap_gap", cache="hit"):
+        gap = stage_cap_gap(bedrooms, deposit_pct, interest, max_monthly)
+    return layers.with_columns(gap=gap)
+
+@st.cache_data(max_entries=32)
+def stage_region_layers(level, stat, bedrooms, deposit_pct=None, interest=None, max_monthly=None):
+    spans.annotate(cache="miss")
+    return load_rollups().layers(level, bedrooms, stat, deposit_pct, interest, max_monthly)
+
+# ---------- figure / table cache ----------
+# One LRU per process (FIG_CACHE_MB), shared by every session; keys digest the exact builder
+# inputs and entries hold figure JSON, so identical views are built once (core.figcache).
+@st.cache_resource
+def figure_cache():
+    return FigureCache()
+
+def cached_fig(name, build, *inputs):
+    """Figure for ``inputs``; ``build`` only runs when its JSON is not cached."""
+    with spans.span(f"{name}_fig") as sp:
+        cache, key = figure_cache(), digest(name, *inputs)
+        text = cache.get(key)
+        if text is None:
+            fig = build()
+            text = cache.put(key, fig_to_json(fig))
+            sp.update(cache="miss", bytes=len(text))
+            return fig
+        sp.update(cache="hit", bytes=len(text))
+        return fig_from_json(text)
+
+def stage_map(metric, use_real_geo, focus, bedrooms, deposit_pct=None, interest=None, max_monthly=None,
+              level="SA2", stat="median"):
+    """``(fig, source, info)``; ``info`` has the level of detail and GeoJSON bytes sent.
+
+    Above SA2 level every SA2 is coloured with its region's rollup value.
+    """
+    layers = stage_layers(bedrooms, deposit_pct, interest, max_monthly)
+    vals = layers.values(metric)
+    vmin, vmax = layers.color_range(metric)
+    regions = None
+    if level != "SA2":
+        with spans.span("rollups", cache="hit"):
+            rollups = load_rollups()
+        with spans.span("region_layers", cache="hit", level=level):
+            region = stage_region_layers(level, stat, bedrooms, deposit_pct, interest, max_monthly)
+        vals = np.append(region.values(metric), np.nan)[rollups.hierarchy.assign(level, layers.codes)]
+        vmin, vmax = region.color_range(metric)
+        regions = rollups.hierarchy.parents(level, layers.codes)
+    higher_is_bad = metric in HIGHER_IS_BAD
+    if use_real_geo:
+        with spans.span("geometry", cache="hit"):
+            gj, source, version = load_sa2_geojson()
+        if gj:
+            with spans.span("topology", cache="hit"):
+                topo = load_topology(version, gj)
+            shown = range(min(len(layers.codes), len(topo.shapes)))
+            lod = level_for(len(shown))
+            codes = layers.codes[:len(shown)]
+            feats = topo.to_geojson(lod, shown)["features"]
+            # not figure-cached: parsing a cached choropleth back costs more than building it
+            with spans.span("map_real_fig", lod=lod):
+                fig = map_real_fig(feats, codes, dict(zip(layers.codes, vals)), metric, vmin, vmax,
+                                   higher_is_bad, regions=regions, region_level=level)
+            with spans.span("map_geojson", lod=lod) as sp:
+                size, hit = figure_cache().fetch(
+                    digest("geojson_bytes", version, lod, codes),
+                    lambda: len(json.dumps(tag_features(feats, codes), separators=(",", ":"))))
+                sp.update(cache="hit" if hit else "miss", bytes=size)
+            return fig, source, {"lod": lod, "bytes": size}
+    else:
+        source = "grid"
+    fig = cached_fig("map_grid", lambda: map_grid_fig(load_cube().grid(), vals, metric, vmin, vmax,
+                                                      higher_is_bad, focus, regions),
+                     layers.codes, vals, metric, vmin, vmax, higher_is_bad, focus, regions)
+    return fig, source, {}
+
+TABLE_COLUMNS = ["SA2_CODE","MedianPrice_adj","MedianRent_week_adj","MedianIncome_annual","PTI","RTI","gap"]
+
+def stage_table(selection, bedrooms, deposit_pct, interest, max_monthly):
+    snap = stage_layers(bedrooms, deposit_pct, interest, max_monthly).frame()
+    rows = snap[snap.SA2_CODE.isin(selection)].loc[:, TABLE_COLUMNS]
+    with spans.span("table_format") as sp:
+        tbl, hit = figure_cache().fetch(digest("table", bedrooms, rows), lambda: format_table(rows, bedrooms))
+        sp.update(cache="hit" if hit else "miss", rows=len(tbl))
+        if tracing_on():   # a deep memory_usage walk; only worth it when the timings are recorded
+            sp.update(bytes=sizeof(tbl))
+    return tbl
+
+def format_table(rows, bedrooms):
+    tbl = rows.rename(columns={
+               "SA2_CODE":"SA2",
+               "MedianPrice_adj":"Median Price",
+               f"MedianRent_week_adj":f"Median Rent ({bedrooms}BR, /wk)",
+               "MedianIncome_annual":"Income (/yr)",
+               "gap":"Payment Cap Gap"
+           })
+    tbl_display = tbl.copy()
+    tbl_display["Median Price"] = tbl_display["Median Price"].map(money)
+    tbl_display[f"Median Rent ({bedrooms}BR, /wk)"] = tbl_display[f"Median Rent ({bedrooms}BR, /wk)"].map(money)
+    tbl_display["Income (/yr)"] = tbl_display["Income (/yr)"].map(money)
+    tbl_display["PTI"] = tbl_display["PTI"].map(lambda x: f"{x:.1f}")
+    tbl_display["RTI"] = tbl_display["RTI"].map(lambda x: f"{x*100:.1f}%")
+    tbl_display["Payment Cap Gap"] = tbl_display["Payment Cap Gap"].map(
+        lambda g: ("✅ " if (isinstance(g,(int,float)) and g<=0) else "❌ ") + (f"{g*100:.1f}%" if pd.notna(g) else "—")
+    )
+    return tbl_display
+
+# every derived series and its city median, once per bedroom setting; charts slice it
+@st.cache_resource
+def load_trends(bedrooms):
+    spans.annotate(cache="miss")
+    return TrendStore(load_cube(), bedrooms)
+
+def ts_with_median(series_key, bedrooms, preset, selection):
+    return load_trends(bedrooms).frame(series_key, preset, selection)
+
+# Lines keep at most one point per pixel column of TREND_WIDTH_PX (LTTB); charts with more points
+# than TREND_WEBGL_POINTS in total are drawn with WebGL.
+TREND_WIDTH_PX = int(os.environ.get("TREND_WIDTH_PX", 700))
+TREND_WEBGL_POINTS = 5000
+TREND_SHOW = {"Lines": "lines", "Min–max band": "band", "Band + lines": "both"}
+BAND_AUTO = 10  # larger selections start with the band
+
+def trend_style(n_lines, n_periods, show="lines"):
+    per_line = min(n_periods, TREND_WIDTH_PX)
+    drawn = (n_lines*(show != "band") + 1 + 2*(show != "lines")) * per_line
+    return dict(max_points=TREND_WIDTH_PX if n_periods > TREND_WIDTH_PX else None,
+                webgl=drawn > TREND_WEBGL_POINTS, lines=show != "band", band=show != "lines")
+
+def stage_trend(title, key, thresholds, bedrooms, preset, selection, show="lines", level="SA2", stat="median"):
+    """Trend chart of the SA2s in ``selection`` or, above SA2 level, of the regions in it."""
+    with spans.span("trend_store", cache="hit"):
+        store = load_trends(bedrooms)
+    if level != "SA2":
+        with spans.span("rollups", cache="hit"):
+            rollups = load_rollups()
+    with spans.span("trend_frame", series=key, preset=preset):
+        if level == "SA2":
+            data = ts_with_median(key, bedrooms, preset, selection)
+        else:
+            data = store.region_frame(rollups, key, level, stat, preset, selection)
+    style = trend_style(data.shape[1] - 2, len(data), show)
+    return cached_fig("trend", lambda: ts_fig(data, title, thresholds, **style), data, title, thresholds, style)
+
+SENS_RATES = np.round(np.arange(2.0, 10.0+1e-9, 0.25), 2)
+SENS_TERMS = np.arange(1, 31)
+SENS_DEPOSITS = np.arange(5, 31)
+
+@st.cache_data(max_entries=64)
+def stage_sensitivity(focus, bedrooms, income, deposit_pct, interest, mortgage_years, max_monthly):
+    """Scenario grid for the focus SA2; the sidebar values are always grid points."""
+    spans.annotate(cache="miss")
+    snap = stage_snapshot(bedrooms)
+    i = max(0, load_cube().ids([focus])[0])
+    axes = {"rate": np.union1d(SENS_RATES, [interest]),
+            "term": np.union1d(SENS_TERMS, [mortgage_years]),
+            "deposit": np.union1d(SENS_DEPOSITS, [deposit_pct])}
+    grid = scenario_grid(snap.columns["MedianPrice_adj"][i:i+1], income, axes["rate"], axes["term"],
+                         axes["deposit"], max_monthly)
+    at = {"sa2": 0, "rate": int(np.searchsorted(axes["rate"], interest)),
+          "term": int(np.searchsorted(axes["term"], mortgage_years)),
+          "deposit": int(np.searchsorted(axes["deposit"], deposit_pct))}
+    return grid, axes, at
 
 # ---------- init data ----------
-df, grid, months = load_synthetic()
-last_month = months[-1].strftime("%Y-%m")
+trace = spans.begin(tracing_on(), **(trace_meta("rerun") if tracing_on() else {}))
+with spans.span("load", cache="hit"):
+    cube = load_cube()
+grid = cube.grid()
+last_month = cube.labels[-1]
 
 # ---------- sidebar ----------
 st.sidebar.title("Settings")
 segment = st.sidebar.radio("Mode", ["Buyers", "Tenants"], index=0)
 segment_key = "buyers" if segment.startswith("Buyers") else "tenants"
-metric = st.sidebar.selectbox("Map layer", ["RTI","PTI","Median Rent","Median Price","Median Income","Payment Cap Gap"], index=0)
+metric = st.sidebar.selectbox("Map layer", LAYERS, index=0)
 bedrooms = st.sidebar.slider("Bedrooms", 1, 3, 2)
 preset = st.sidebar.selectbox("Period", ["Max","5y","3y","1y"], index=0)
+level = st.sidebar.selectbox("Geography level", LEVELS, index=0, format_func=LEVEL_LABELS.get,
+                             help="Map and trends at SA3, SA4 or GCCSA level, aggregated from SA2s.")
+stat = "median"
+if level != "SA2":
+    stat = st.sidebar.selectbox("Aggregate", STATS, format_func=STAT_LABELS.get,
+                                help="Median or weighted mean of the region's SA2 values.")
 
 use_real_geo = st.sidebar.checkbox("Real SA2 polygons", True,
                                    help="If off — shows a compact 3×4 grid.")
@@ -156,15 +325,16 @@ use_real_geo = st.sidebar.checkbox("Real SA2 polygons", True,
 sa2_all = grid["SA2_CODE"].tolist()
 
 # --- selection state
+MAX_COMPARE = int(os.environ.get("MAX_COMPARE_SA2", 50))  # SA2s compared in the table and trends
 if "selected_sa2" not in st.session_state:
     st.session_state.selected_sa2 = sa2_all[:3]
 if "focus_sa2" not in st.session_state:
     st.session_state.focus_sa2 = st.session_state.selected_sa2[0]
 
-selected_from_ui = st.sidebar.multiselect("Compare SA2 (up to 3)", options=sa2_all,
-                                          default=st.session_state.selected_sa2, key="ms_sa2")
-# keep up to 3
-selected_from_ui = list(selected_from_ui)[:3]
+selected_from_ui = st.sidebar.multiselect(f"Compare SA2 (up to {MAX_COMPARE})", options=sa2_all,
+                                          default=st.session_state.selected_sa2[:MAX_COMPARE], key="ms_sa2",
+                                          max_selections=MAX_COMPARE)
+selected_from_ui = list(selected_from_ui)[:MAX_COMPARE]
 if selected_from_ui != st.session_state.selected_sa2:
     st.session_state.selected_sa2 = selected_from_ui
 if st.session_state.focus_sa2 not in st.session_state.selected_sa2:
@@ -179,300 +349,277 @@ interest      = st.sidebar.slider("Mortgage rate (%/yr)", 2.0, 10.0, 6.0, step=0
 mortgage_years= st.sidebar.slider("Mortgage term (years)", 1, 30, 25)
 max_monthly   = st.sidebar.number_input("Max monthly payment (A$)", value=2500, min_value=0, step=50)
 
-# ---------- filtering ----------
-end_idx = len(months)-1
-start_idx = 0 if preset=="Max" else max(0, end_idx-{"5y":60,"3y":36,"1y":12}[preset])
-month_set = set([d.strftime("%Y-%m") for d in months[start_idx:]])
-dfp = df[df["date"].isin(month_set)].copy()
-
-# ---------- latest snapshot & metrics ----------
-brR = RENT_BEDROOM_COEFFS.get(bedrooms,1.0)
-brP = PRICE_BEDROOM_COEFFS.get(bedrooms,1.0)
-
-snap = (dfp[dfp["date"]==last_month]
-        .assign(MedianRent_week_adj=lambda x: x.MedianRent_week*brR,
-                MedianPrice_adj=lambda x: x.MedianPrice*brP,
-                PTI=lambda x: x.MedianPrice_adj/x.MedianIncome_annual,
-                RTI=lambda x: (x.MedianRent_week_adj*52)/x.MedianIncome_annual))
-
-focus_sa2 = st.session_state.focus_sa2
-focus_row = snap[snap.SA2_CODE==focus_sa2].iloc[0] if not snap[snap.SA2_CODE==focus_sa2].empty else snap.iloc[0]
-
-price_adj = float(focus_row.MedianPrice_adj)
-income = float(income_user)
-deposit_target = deposit_pct/100 * price_adj
-loan_principal = max(0.0, price_adj - deposit_target)
-monthly_payment = annuity_monthly(loan_principal, interest/100.0, mortgage_years)
-mti = (monthly_payment*12) / max(1e-9, income)
-
-# Cap-gap baseline (fixed 25y)
-LcapMap = principal_from_monthly(max_monthly, interest/100.0, 25)
-cap_gap = (snap.assign(L_needed=lambda x: x.MedianPrice_adj*(1-deposit_pct/100.0))
-                .assign(gap=lambda x: (x.L_needed - LcapMap)/x.MedianPrice_adj)
-                [["SA2_CODE","gap"]])
-
-def value_for_metric_row(row):
-    if metric=="Median Rent":   return row.MedianRent_week_adj
-    if metric=="Median Price":  return row.MedianPrice_adj
-    if metric=="Median Income": return row.MedianIncome_annual
-    if metric=="PTI":           return row.PTI
-    if metric=="Payment Cap Gap":
-        g = cap_gap.loc[cap_gap.SA2_CODE==row.SA2_CODE,"gap"]
-        return float(g.iloc[0]) if not g.empty else np.nan
-    return row.RTI
-
-vals_all = snap.apply(value_for_metric_row, axis=1)
-vmin, vmax = float(np.nanmin(vals_all)), float(np.nanmax(vals_all))
-higher_is_bad = metric in ["Median Price","Median Rent","PTI","RTI","Payment Cap Gap"]
+# inputs the stages are keyed on (core.stages.STAGES)
+inputs = dict(segment=segment_key, metric=metric, bedrooms=bedrooms, preset=preset,
+              use_real_geo=use_real_geo, selection=tuple(st.session_state.selected_sa2),
+              focus=st.session_state.focus_sa2, income=float(income_user), savings=float(savings),
+              deposit_pct=deposit_pct, interest=interest, mortgage_years=mortgage_years,
+              max_monthly=max_monthly, level=level, stat=stat)
 
 # ---------- header ----------
 st.markdown("## 🏠 Housing affordability dashboard — Sydney (SA2, synthetic)")
 st.caption(f"Metric: **{metric}**. Selected: {', '.join(st.session_state.selected_sa2)}")
 
 # ---------- maps ----------
-def map_grid_fig():
-    dfm = snap.merge(grid, on="SA2_CODE")
-    dfm["val"] = dfm.apply(value_for_metric_row, axis=1)
-    W,H = 400, 300
-    w, h = W/4.0, H/3.0
-    fig = go.Figure()
-    for _, r in dfm.iterrows():
-        x0, y0 = r["col"]*w, r["row"]*h
-        x1, y1 = x0+w, y0+h
-        t = 0 if vmax==vmin else (r["val"]-vmin)/(vmax-vmin)
-        c = px.colors.sample_colorscale(color_scale_gyr(not higher_is_bad), t)[0]
-        fig.add_shape(type="rect", x0=x0+2, x1=x1-2, y0=y0+2, y1=y1-2,
-                      line=dict(color="#111" if r["SA2_CODE"]==focus_sa2 else "white",
-                                width=3 if r["SA2_CODE"]==focus_sa2 else 2),
-                      fillcolor=c)
-        fig.add_trace(go.Scatter(
-            x=[(x0+x1)/2], y=[(y0+y1)/2], mode="text",
-            text=[r["SA2_CODE"]], hovertext=f"{r['SA2_CODE']} — {metric}: {r['val']:.3g}",
-            hoverinfo="text", name=r["SA2_CODE"]
-        ))
-    fig.update_xaxes(visible=False, range=[0,W])
-    fig.update_yaxes(visible=False, range=[H,0])
-    fig.update_layout(height=360, margin=dict(l=10,r=10,t=10,b=10),
-                      plot_bgcolor="white", paper_bgcolor="white",
-                      showlegend=False)
-    return fig
-
-def map_real_fig():
-    gj, source = load_sa2_geojson(max_features=15)
-    if not gj:
-        return None, "no-geo"
-
-    # Tie first N polygons to our SA2_01.. codes
-    feats = gj["features"]
-    n = min(12, len(feats))
-    codes = [f"SA2_{i+1:02d}" for i in range(n)]
-    for i, f in enumerate(feats[:n]):
-        props = f.setdefault("properties", {})
-        props["loc_code"] = codes[i]
-
-    # metric values
-    snap_map = snap.set_index("SA2_CODE")
-    values = [value_for_metric_row(snap_map.loc[c]) if c in snap_map.index else np.nan for c in codes]
-    df_map = pd.DataFrame({"SA2_CODE": codes, "val": values})
-
-    fig = px.choropleth(
-        df_map, geojson={"type":"FeatureCollection","features":feats[:n]},
-        locations="SA2_CODE", color="val",
-        featureidkey="properties.loc_code",
-        color_continuous_scale=color_scale_gyr(not higher_is_bad),
-        range_color=(vmin, vmax),
-        projection="mercator"
-    )
-    fig.update_geos(fitbounds="geojson", visible=False)
-    fig.update_layout(
-        height=520, margin=dict(l=0,r=0,t=0,b=0),
-        coloraxis_colorbar=dict(title=metric)
-    )
-    return fig, source
+def toggle_selection(code):
+    sel = list(st.session_state.selected_sa2)
+    if code in sel: sel.remove(code)
+    elif len(sel) < MAX_COMPARE: sel.append(code)
+    st.session_state.selected_sa2 = sel
+    st.session_state.focus_sa2 = code
+
+def handle_click(fig, key, code_of):
+    """Render with click capture; a new click changes the selection and reruns the app."""
+    from streamlit_plotly_events import plotly_events
+    clicks = plotly_events(fig, click_event=True, hover_event=False, select_event=False, key=key)
+    if not clicks:
+        return
+    # the component keeps returning its last event, so act on each click once
+    stamp = json.dumps(clicks[0], sort_keys=True, default=str)
+    if st.session_state.get(f"{key}_last") == stamp:
+        return
+    st.session_state[f"{key}_last"] = stamp
+    code = code_of(clicks[0])
+    if isinstance(code, str):
+        toggle_selection(code)
+        st.rerun()
+
+SOURCE_LABELS = {"abs": "ABS ArcGIS", "github": "GitHub", "file": "local file", "local": "local server"}
+
+@st.fragment
+@traced("map")
+def map_panel(args):
+    fig, src, info = stage_map(**args)
+    if args["level"] != "SA2":
+        st.caption(f"{STAT_LABELS[args['stat']]} per {LEVEL_LABELS[args['level']]} in {last_month}; "
+                   f"each SA2 shows its region's value.")
+    if args["use_real_geo"] and src == "none":
+        st.warning("Failed to load real SA2 — showing compact grid.")
+    grid_key = "grid_click" if args["use_real_geo"] else "grid_click2"
+    if src not in ("grid", "none"):
+        if HAVE_PLOTLY_EVENTS:
+            handle_click(fig, "real_click", lambda c: c.get("location"))  # our loc_code = SA2_xx
+        else:
+            st.plotly_chart(fig, use_container_width=True)
+        src_label = SOURCE_LABELS.get(src, "—")
+        st.caption(f"Polygon source: {src_label} · detail level {info['lod']} · "
+                   f"{info['bytes']/1024:,.0f} kB GeoJSON")
+    elif HAVE_PLOTLY_EVENTS:
+        # heatmap clicks carry cell coordinates (x=col, y=row)
+        handle_click(fig, grid_key, lambda c: grid_code_at(grid, c.get("x", -1), c.get("y", -1)))
+    else:
+        st.plotly_chart(fig, use_container_width=True)
 
 with st.container():
     c1, c2 = st.columns([1,2.2])
     with c1:
         st.subheader("Map: layer")
     with c2:
-        if use_real_geo:
-            fig_real, src = map_real_fig()
-            if fig_real is None:
-                st.warning("Failed to load real SA2 — showing compact grid.")
-                fig = map_grid_fig()
-                if HAVE_PLOTLY_EVENTS:
-                    clicks = plotly_events(fig, click_event=True, hover_event=False, select_event=False, key="grid_click")
-                    if clicks:
-                        code = clicks[0].get("text") or clicks[0].get("name")
-                        if isinstance(code, str):
-                            sel = list(st.session_state.selected_sa2)
-                            if code in sel: sel.remove(code)
-                            elif len(sel) < 3: sel.append(code)
-                            st.session_state.selected_sa2 = sel
-                            st.session_state.focus_sa2 = code
-                else:
-                    st.plotly_chart(fig, use_container_width=True)
-            else:
-                if HAVE_PLOTLY_EVENTS:
-                    clicks = plotly_events(fig_real, click_event=True, hover_event=False, select_event=False, key="real_click")
-                    if clicks:
-                        code_clicked = clicks[0].get("location")  # our loc_code = SA2_xx
-                        if isinstance(code_clicked, str):
-                            sel = list(st.session_state.selected_sa2)
-                            if code_clicked in sel: sel.remove(code_clicked)
-                            elif len(sel) < 3: sel.append(code_clicked)
-                            st.session_state.selected_sa2 = sel
-                            st.session_state.focus_sa2 = code_clicked
-                else:
-                    st.plotly_chart(fig_real, use_container_width=True)
-                src_label = "ABS ArcGIS" if src=="abs" else ("GitHub" if src=="github" else "—")
-                st.caption(f"Polygon source: {src_label}")
-        else:
-            fig = map_grid_fig()
-            if HAVE_PLOTLY_EVENTS:
-                clicks = plotly_events(fig, click_event=True, hover_event=False, select_event=False, key="grid_click2")
-                if clicks:
-                    code = clicks[0].get("text") or clicks[0].get("name")
-                    if isinstance(code, str):
-                        sel = list(st.session_state.selected_sa2)
-                        if code in sel: sel.remove(code)
-                        elif len(sel) < 3: sel.append(code)
-                        st.session_state.selected_sa2 = sel
-                        st.session_state.focus_sa2 = code
-            else:
-                st.plotly_chart(fig, use_container_width=True)
+        try:
+            map_panel(stage_args("maps", inputs))
+        except BaseException:
+            # a map click's st.rerun() stops the script here, before the spans.end below
+            spans.end(trace, span_exporter())
+            raise
 
 # ---------- comparison table ----------
-st.subheader("📊 Selected SA2 comparison")
-sel_now = st.session_state.selected_sa2
-tbl = (snap[snap.SA2_CODE.isin(sel_now)]
-       .merge(cap_gap, on="SA2_CODE", how="left")
-       .loc[:, ["SA2_CODE","MedianPrice_adj","MedianRent_week_adj","MedianIncome_annual","PTI","RTI","gap"]]
-       .rename(columns={
-           "SA2_CODE":"SA2",
-           "MedianPrice_adj":"Median Price",
-           f"MedianRent_week_adj":f"Median Rent ({bedrooms}BR, /wk)",
-           "MedianIncome_annual":"Income (/yr)",
-           "gap":"Payment Cap Gap"
-       }))
-tbl_display = tbl.copy()
-tbl_display["Median Price"] = tbl_display["Median Price"].map(money)
-tbl_display[f"Median Rent ({bedrooms}BR, /wk)"] = tbl_display[f"Median Rent ({bedrooms}BR, /wk)"].map(money)
-tbl_display["Income (/yr)"] = tbl_display["Income (/yr)"].map(money)
-tbl_display["PTI"] = tbl_display["PTI"].map(lambda x: f"{x:.1f}")
-tbl_display["RTI"] = tbl_display["RTI"].map(lambda x: f"{x*100:.1f}%")
-tbl_display["Payment Cap Gap"] = tbl_display["Payment Cap Gap"].map(
-    lambda g: ("✅ " if (isinstance(g,(int,float)) and g<=0) else "❌ ") + (f"{g*100:.1f}%" if pd.notna(g) else "—")
-)
-st.dataframe(tbl_display, use_container_width=True, hide_index=True)
+@st.fragment
+@traced("table")
+def table_panel(args):
+    st.subheader("📊 Selected SA2 comparison")
+    st.dataframe(stage_table(**args), use_container_width=True, hide_index=True)
+
+table_panel(stage_args("table", inputs))
 
 # ---------- buyer / tenant panels ----------
-st.subheader("🔧 Parameters & calculations")
-if segment_key == "buyers":
-    buyer_mode = st.radio("Buyer mode", ["Budget","25y → MTI","Term → income"], horizontal=True)
-    monthly25 = annuity_monthly(loan_principal, interest/100.0, 25)
-    mti25 = (monthly25*12)/max(1e-9,income)
-    LcapUser = principal_from_monthly(max_monthly, interest/100.0, mortgage_years)
-    P_affordable = LcapUser / max(1e-9, 1 - deposit_pct/100.0)
-    income_required_fixedSR = (monthly_payment*12)/0.25
-
-    cA, cB, cC = st.columns(3)
-    cA.metric("Price (size-adjusted)", money(price_adj))
-    cB.metric("Minimum deposit", money(deposit_target))
-    cC.metric("Your income /yr", money(income))
-
-    if buyer_mode == "Budget":
-        c1, c2, c3 = st.columns(3)
-        c1.metric("Affordable price", money(P_affordable), help="From your monthly limit and current rate/term")
-        c2.metric("Payment (/mo)", money(monthly_payment))
-        c3.metric("MTI (income share)", f"{mti*100:.1f}%")
-    elif buyer_mode == "25y → MTI":
-        c1, c2, c3 = st.columns(3)
-        c1.metric("Payment at 25y", money(monthly25)+"/mo")
-        c2.metric("MTI (25y)", f"{mti25*100:.1f}%")
-        c3.metric("Price", money(price_adj))
+@st.fragment
+@traced("buyer")
+def buyer_panel(segment, focus, income, deposit_pct, interest, mortgage_years, max_monthly, bedrooms):
+    snap = stage_snapshot(bedrooms).frame()
+    focus_id = cube.ids([focus])[0]
+    focus_row = snap.iloc[focus_id if focus_id >= 0 else 0]
+    brR = RENT_BEDROOM_COEFFS.get(bedrooms,1.0)
+
+    price_adj = float(focus_row.MedianPrice_adj)
+    deposit_target = deposit_pct/100 * price_adj
+    loan_principal = max(0.0, price_adj - deposit_target)
+    monthly_payment = annuity_monthly(loan_principal, interest/100.0, mortgage_years)
+    mti = (monthly_payment*12) / max(1e-9, income)
+
+    st.subheader("🔧 Parameters & calculations")
+    if segment == "buyers":
+        buyer_mode = st.radio("Buyer mode", ["Budget","25y → MTI","Term → income"], horizontal=True)
+        monthly25 = annuity_monthly(loan_principal, interest/100.0, 25)
+        mti25 = (monthly25*12)/max(1e-9,income)
+        LcapUser = principal_from_monthly(max_monthly, interest/100.0, mortgage_years)
+        P_affordable = LcapUser / max(1e-9, 1 - deposit_pct/100.0)
+        income_required_fixedSR = (monthly_payment*12)/0.25
+
+        cA, cB, cC = st.columns(3)
+        cA.metric("Price (size-adjusted)", money(price_adj))
+        cB.metric("Minimum deposit", money(deposit_target))
+        cC.metric("Your income /yr", money(income))
+
+        if buyer_mode == "Budget":
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Affordable price", money(P_affordable), help="From your monthly limit and current rate/term")
+            c2.metric("Payment (/mo)", money(monthly_payment))
+            c3.metric("MTI (income share)", f"{mti*100:.1f}%")
+        elif buyer_mode == "25y → MTI":
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Payment at 25y", money(monthly25)+"/mo")
+            c2.metric("MTI (25y)", f"{mti25*100:.1f}%")
+            c3.metric("Price", money(price_adj))
+        else:
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Income needed at MTI=25%", money(income_required_fixedSR))
+            c2.metric("Payment (/mo)", money(monthly_payment))
+            c3.metric("Price", money(price_adj))
+
+        if mti >= 0.40:
+            st.warning("MTI ≥ 40% — high mortgage burden.")
+        elif mti >= 0.30:
+            st.warning("MTI 30–40% — elevated burden.")
     else:
-        c1, c2, c3 = st.columns(3)
-        c1.metric("Income needed at MTI=25%", money(income_required_fixedSR))
-        c2.metric("Payment (/mo)", money(monthly_payment))
-        c3.metric("Price", money(price_adj))
-
-    if mti >= 0.40:
-        st.warning("MTI ≥ 40% — high mortgage burden.")
-    elif mti >= 0.30:
-        st.warning("MTI 30–40% — elevated burden.")
-else:
-    rent_week = float(focus_row.MedianRent_week*brR)
-    rent_month = rent_week*52/12
-    rti_user = (rent_week*52)/max(1e-9, income)
-    cA, cB, cC = st.columns(3)
-    cA.metric(f"Rent {bedrooms}BR (/wk)", money(rent_week))
-    cB.metric("Rent (/mo)", money(rent_month))
-    cC.metric("RTI", f"{rti_user*100:.1f}%")
-    if rti_user >= 0.30:
-        st.warning("RTI ≥ 30% — rental stress.")
-    elif rti_user >= 0.25:
-        st.info("RTI 25–30% — borderline burden.")
-
-# ---------- time series ----------
-def ts_with_median(series_key: str):
-    RENT = RENT_BEDROOM_COEFFS.get(bedrooms,1.0)
-    sub = df[df["date"].isin(month_set)].copy()
-    sub["Rent"] = sub["MedianRent_week"]*RENT
-    sub["RentMonthly"] = sub["Rent"]*52/12
-    sub["Price"] = sub["MedianPrice"]
-    sub["PTI"] = sub["MedianPrice"]/sub["MedianIncome_annual"]
-    sub["RTI"] = (sub["Rent"]*52)/sub["MedianIncome_annual"]
-
-    lines = []
-    for code in (st.session_state.selected_sa2 if st.session_state.selected_sa2 else [sa2_all[0]]):
-        d = sub[sub.SA2_CODE==code][["date",series_key]].sort_values("date")
-        d = d.rename(columns={series_key: code})
-        lines.append(d.set_index("date"))
-
-    med = (sub.groupby("date")[series_key].median().rename("median")).to_frame()
-    base = med.copy()
-    for s in lines: base = base.join(s, how="left")
-    base = base.reset_index().sort_values("date")
-    return base
-
-def ts_fig(title, key, thresholds=None):
-    data = ts_with_median(key)
-    fig = go.Figure()
-    if thresholds:
-        for (y1,y2,color) in thresholds:
-            fig.add_shape(type="rect", xref="paper", x0=0, x1=1, y0=y1, y1=y2,
-                          fillcolor=color, opacity=0.12, layer="below", line_width=0)
-    for col in data.columns:
-        if col in ("date","median"): continue
-        fig.add_trace(go.Scatter(x=data["date"], y=data[col], name=col, mode="lines", line=dict(width=1.5)))
-    fig.add_trace(go.Scatter(x=data["date"], y=data["median"], name="Median (city)",
-                             mode="lines", line=dict(color="black", width=3)))
-    fig.update_layout(title=title, height=340, margin=dict(l=10,r=10,t=40,b=10))
-    return fig
-
-st.subheader("📈 Trends")
-if segment_key == "tenants":
+        rent_week = float(focus_row.MedianRent_week*brR)
+        rent_month = rent_week*52/12
+        rti_user = (rent_week*52)/max(1e-9, income)
+        cA, cB, cC = st.columns(3)
+        cA.metric(f"Rent {bedrooms}BR (/wk)", money(rent_week))
+        cB.metric("Rent (/mo)", money(rent_month))
+        cC.metric("RTI", f"{rti_user*100:.1f}%")
+        if rti_user >= 0.30:
+            st.warning("RTI ≥ 30% — rental stress.")
+        elif rti_user >= 0.25:
+            st.info("RTI 25–30% — borderline burden.")
+
+buyer_panel(**stage_args("buyer", inputs))
+
+# ---------- affordability sensitivity ----------
+SENS_OUTPUTS = {"MTI": ("mti", ".1%"), "Payment Cap Gap": ("gap", ".1%"), "Payment (/mo)": ("payment", ",.0f")}
+SENS_AXES = {"Rate × Term": ("term", "rate"), "Rate × Deposit": ("deposit", "rate"),
+             "Term × Deposit": ("deposit", "term")}
+AXIS_TITLES = {"rate": "Rate (%/yr)", "term": "Term (years)", "deposit": "Deposit (%)"}
+
+@st.fragment
+@traced("sensitivity")
+def sensitivity_panel(segment, focus, income, deposit_pct, interest, mortgage_years, max_monthly, bedrooms):
+    if segment != "buyers":
+        return
+    st.subheader("🧮 Sensitivity")
     c1, c2 = st.columns(2)
-    c1.plotly_chart(ts_fig(f"Median Rent ({bedrooms}BR, month)", "RentMonthly"),
+    show = c1.radio("Show", list(SENS_OUTPUTS), horizontal=True, key="sens_show",
+                    help="Cap gap here uses the scenario term for the payment-cap loan.")
+    axes_label = c2.radio("Axes", list(SENS_AXES), horizontal=True, key="sens_axes")
+    with spans.span("scenario_grid", cache="hit"):
+        grid, axes, at = stage_sensitivity(focus, bedrooms, income, deposit_pct, interest,
+                                           mortgage_years, max_monthly)
+    out, fmt = SENS_OUTPUTS[show]
+    x_axis, y_axis = SENS_AXES[axes_label]
+    z = sensitivity(grid[out], x_axis, y_axis, at)
+    current = (axes[x_axis][at[x_axis]], axes[y_axis][at[y_axis]])
+    st.plotly_chart(sensitivity_fig(z, axes[x_axis], axes[y_axis], AXIS_TITLES[x_axis],
+                                    AXIS_TITLES[y_axis], show, current, fmt),
                     use_container_width=True)
-    c2.plotly_chart(ts_fig("RTI", "RTI",
-                           thresholds=[(0,0.25,"green"),(0.25,0.30,"gold"),(0.30,1.0,"crimson")]),
-                    use_container_width=True)
-else:
-    c1, c2 = st.columns(2)
-    c1.plotly_chart(ts_fig(f"Median Rent ({bedrooms}BR, week)", "Rent"),
-                    use_container_width=True)
-    c2.plotly_chart(ts_fig("Median Price", "Price"),
-                    use_container_width=True)
-    c3, c4 = st.columns(2)
-    c3.plotly_chart(ts_fig("PTI", "PTI",
-                           thresholds=[(0,8,"green"),(8,10,"gold"),(10,99,"crimson")]),
-                    use_container_width=True)
-    c4.plotly_chart(ts_fig("RTI", "RTI",
-                           thresholds=[(0,0.25,"green"),(0.25,0.30,"gold"),(0.30,1.0,"crimson")]),
+    st.caption(f"{focus}, {bedrooms}BR; other inputs fixed at the sidebar values.")
+
+sensitivity_panel(**stage_args("sensitivity", inputs))
+
+# ---------- time series ----------
+@st.fragment
+@traced("trends")
+def trends_panel(segment, preset, selection, bedrooms, level, stat):
+    def chart(col, title, key, thresholds=None):
+        with spans.span("trend_chart", series=key):
+            col.plotly_chart(stage_trend(title, key, thresholds, bedrooms, preset, lines, show, level, stat),
+                             use_container_width=True)
+
+    if level == "SA2":
+        st.subheader("📈 Trends")
+        lines, label = selection, "Selected SA2s"
+    else:
+        # the regions the selected SA2s belong to, in selection order
+        st.subheader(f"📈 Trends — {STAT_LABELS[stat].lower()} per {LEVEL_LABELS[level]}")
+        with spans.span("hierarchy", cache="hit"):
+            parents = load_hierarchy().parents(level, selection)
+        lines = tuple(r for r in dict.fromkeys(parents) if r is not None)
+        label = f"Selected {level} regions"
+    show = "lines"
+    if len(lines) > 1:
+        show = TREND_SHOW[st.radio(label, list(TREND_SHOW), horizontal=True,
+                                   index=0 if len(lines) <= BAND_AUTO else 2)]
+    if segment == "tenants":
+        c1, c2 = st.columns(2)
+        chart(c1, f"Median Rent ({bedrooms}BR, month)", "RentMonthly")
+        chart(c2, "RTI", "RTI", RTI_BANDS)
+    else:
+        c1, c2 = st.columns(2)
+        chart(c1, f"Median Rent ({bedrooms}BR, week)", "Rent")
+        chart(c2, "Median Price", "Price")
+        c3, c4 = st.columns(2)
+        chart(c3, "PTI", "PTI", PTI_BANDS)
+        chart(c4, "RTI", "RTI", RTI_BANDS)
+
+trends_panel(**stage_args("trends", inputs))
+
+# ---------- affordability finder ----------
+# sorted per-month indexes over every SA2 and month; one index serves all bedroom settings
+@st.cache_resource
+def load_finder():
+    spans.annotate(cache="miss")
+    return AffordabilityIndex(load_cube())
+
+@st.fragment
+@traced("finder")
+def finder_panel(segment, bedrooms, income, savings, deposit_pct, interest, mortgage_years, max_monthly):
+    st.subheader("🔎 Where can I afford?")
+    with spans.span("finder_index", cache="hit"):
+        index = load_finder()
+    if segment == "buyers":
+        max_mti = st.slider("Max MTI (%)", 20, 50, 30, key="finder_mti") / 100
+        ceiling = price_ceiling(income, savings, deposit_pct, interest, mortgage_years, max_monthly, max_mti)
+        metric, value_label = "price", f"Price ({bedrooms}BR)"
+        st.caption(f"Price ceiling **{money(ceiling)}**: the lower of your monthly limit, "
+                   f"{max_mti:.0%} of income, and savings as a {deposit_pct}% deposit.")
+    else:
+        max_rti = st.slider("Max RTI (%)", 20, 50, 30, key="finder_rti") / 100
+        ceiling = rent_ceiling(income, max_rti)
+        metric, value_label = "rent", f"Rent ({bedrooms}BR, /wk)"
+        st.caption(f"Rent ceiling **{money(ceiling)}/wk**: {max_rti:.0%} of income.")
+    with spans.span("finder_query") as sp:
+        ranked = index.search(metric, bedrooms, ceiling)
+        timeline = index.timeline(metric, bedrooms, ceiling)
+        sp.update(rows=len(ranked))
+
+    c1, c2 = st.columns([3, 2])
+    c1.markdown(f"**{len(ranked)} of {len(index.codes)} SA2s** within budget in {last_month}, cheapest first.")
+    c1.dataframe(pd.DataFrame({
+        "SA2": ranked["SA2_CODE"], value_label: ranked["value"].map(money),
+        "Headroom": ranked["headroom"].map(lambda h: f"{h*100:.1f}%"),
+        "First affordable": ranked["first_affordable"].fillna("—"),
+        "Affordable since": ranked["affordable_since"].fillna("—"),
+    }), hide_index=True, use_container_width=True, height=300)
+    c2.plotly_chart(cached_fig("finder_timeline", lambda: finder_timeline_fig(timeline, len(index.codes),
+                                                                             "SA2s within budget"),
+                               timeline, len(index.codes)),
                     use_container_width=True)
 
+finder_panel(**stage_args("finder", inputs))
+
+# ---------- debug panel ----------
+st.sidebar.divider()
+show_timings = st.sidebar.checkbox("Show timings", key="debug_spans",
+                                   help="Per-stage timings of this rerun, with cache hits and payload sizes.")
+spans.end(trace, span_exporter())
+if show_timings and trace.enabled:
+    with st.sidebar.expander("Rerun timings", expanded=True):
+        st.dataframe(pd.DataFrame([{"stage": "· "*s["depth"] + s["name"], "ms": round(s["ms"], 1),
+                                    "cache": s.get("cache", ""), "kB": round(s["bytes"]/1024, 1) if "bytes" in s else None}
+                                   for s in trace.spans]),
+                     hide_index=True, use_container_width=True)
+        stats = figure_cache().stats()
+        st.caption(f"Rerun {trace.total_ms:,.0f} ms · figure cache: {stats['hits']:,} hits, "
+                   f"{stats['misses']:,} misses, {stats['bytes']/2**20:,.1f} of {stats['max_bytes']/2**20:,.0f} MB")
+
 st.caption("Synthetic data. Colors: green is better/cheaper, red is worse/more expensive. "
            "Polygon layer loads from ABS ArcGIS; when unavailable it falls back to a backup source or the grid.")
-
@@ -0,0 +1 @@
+"""Headless benchmarks for the dashboard's compute and figure stages."""
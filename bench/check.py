@@ -0,0 +1,277 @@
+"""Exactness checks for the vectorized code paths.
+
+Each check compares a fast path against a frozen slice of the original
+output or against a direct scalar/brute-force computation, so a later
+optimization cannot silently change the numbers.
+
+    python -m bench.check                 # run every check
+    python -m bench.check synthetic       # just the named ones
+
+Exits 1 if any check fails.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+
+# ---------- checks ----------
+# name -> zero-argument callable returning a list of failure messages
+# (SA2, month offset) -> (price, weekly rent, income) of the original per-row generator
+SYNTHETIC_FROZEN = {
+    ("SA2_01", 0): (700991.8514461744, 622.5703215559367, 98241.50529345321),
+    ("SA2_01", 128): (855737.2521237523, 725.9613608004607, 108504.34898343318),
+    ("SA2_07", 60): (950707.6689953209, 690.8222632399542, 116712.94248734317),
+    ("SA2_12", 128): (1925467.8341358406, 625.6833117993326, 112368.95819180334),
+}
+
+
+def check_synthetic():
+    """``simulate`` reproduces the scalar mulberry32 generator bit for bit."""
+    from core.synthetic import SEED, mulberry32, mulberry32_array, simulate
+    bad = []
+    rnd = mulberry32(SEED)
+    scalar = np.array([rnd() for _ in range(5000)])
+    if not np.array_equal(mulberry32_array(SEED, 5000), scalar):
+        bad.append("mulberry32_array differs from mulberry32")
+    codes, _, fields = simulate()
+    for (code, t), want in SYNTHETIC_FROZEN.items():
+        i = codes.index(code)
+        got = tuple(float(fields[f][i, t]) for f in ("MedianPrice", "MedianRent_week", "MedianIncome_annual"))
+        if got != want:
+            bad.append(f"simulate {code} t={t}: {got} != {want}")
+    return bad
+
+
+def check_scenarios():
+    """``scenario_grid`` equals the scalar finance functions element by element."""
+    from core.finance import annuity_monthly, principal_from_monthly, scenario_grid
+    prices, incomes = np.array([0.0, 480000.0, 1234567.8]), np.array([95000.0, 60000.0, 150000.0])
+    rates, terms, deposits, cap = np.array([0.0, 2.5, 6.1]), np.array([1, 25, 30]), np.array([5, 20, 30]), 2500
+    grid = scenario_grid(prices, incomes, rates, terms, deposits, cap)
+    fixed = scenario_grid(prices, incomes, rates, terms, deposits, cap, cap_years=30, outputs=("gap",))
+    bad = []
+    for i, (price, income) in enumerate(zip(prices, incomes)):
+        for j, rate in enumerate(rates):
+            for k, years in enumerate(terms):
+                for l, dep in enumerate(deposits):
+                    payment = annuity_monthly(max(0.0, price - dep/100*price), rate/100, years)
+                    want = {"payment": payment, "mti": payment*12/max(1e-9, income),
+                            "affordable_price": principal_from_monthly(cap, rate/100, years) / max(1e-9, 1 - dep/100)}
+                    if price:
+                        want["gap"] = (price*(1 - dep/100) - principal_from_monthly(cap, rate/100, years))/price
+                        want["gap_30y"] = (price*(1 - dep/100) - principal_from_monthly(cap, rate/100, 30))/price
+                    for name, v in want.items():
+                        a = np.broadcast_to(fixed["gap"] if name == "gap_30y" else grid[name], (3, 3, 3, 3))
+                        if a[i, j, k, l] != v:
+                            bad.append(f"{name} at price={price} rate={rate} term={years} deposit={dep}: "
+                                       f"{a[i, j, k, l]!r} != {v!r}")
+    return bad
+
+
+def check_sketch():
+    """Sketch medians sit within ``alpha`` of the exact order statistic, per bedroom filter."""
+    import pandas as pd
+    from core.ingest import SketchSource
+    rng = np.random.default_rng(0)
+    n = 20000
+    sales = pd.DataFrame({"date": rng.choice(["2021-01-01", "2021-02-01"], n),
+                          "SA2_CODE": rng.choice(["A", "B", "C"], n),
+                          "bedrooms": rng.integers(1, 5, n), "price": rng.lognormal(13.4, 0.5, n)})
+    incomes = sales[["date", "SA2_CODE"]].assign(annual_income=rng.lognormal(11.4, 0.4, n))
+    src = SketchSource(chunksize=3000)
+    src.ingest_chunks((sales.iloc[i:i + 3000] for i in range(0, n, 3000)), "sale")
+    src.ingest_chunks((incomes.iloc[i:i + 3000] for i in range(0, n, 3000)), "income")
+    bad = []
+    for beds in (None, 2):
+        panel = src.panel(bedrooms=beds).set_index(["date", "SA2_CODE"])
+        for field, records, col in (("MedianPrice", sales, "price"), ("MedianIncome_annual", incomes, "annual_income")):
+            if field == "MedianPrice" and beds is not None:
+                records = records[records["bedrooms"] == beds]
+            for (d, code), v in records.groupby(["date", "SA2_CODE"])[col]:
+                v = np.sort(v.to_numpy())
+                want, got = v[int(0.5*(len(v) - 1))], panel[field].get((d[:7], code), np.nan)
+                if not abs(got/want - 1) <= src.alpha:
+                    bad.append(f"{field} bedrooms={beds} {d[:7]} {code}: {got!r} vs exact {want!r}")
+    return bad
+
+
+def _lttb_one(y, n_out):
+    """Textbook per-point LTTB of one series, with ``lttb``'s NaN rule."""
+    n = len(y)
+    if n_out >= n:
+        return list(range(n))
+    if n_out < 3:
+        return [0, n - 1][:max(n_out, 1)]
+    edge = lambda k: k*(n - 2)//(n_out - 2) + 1   # n_out-2 buckets over 1..n-2
+    keep, a = [0], 0
+    for i in range(n_out - 2):
+        lo, hi = edge(i), edge(i + 1)
+        nxt_hi = edge(i + 2) if i < n_out - 3 else n
+        nxt = y[hi:nxt_hi]
+        cx = (hi + nxt_hi - 1)/2
+        cy = np.nansum(nxt)/np.count_nonzero(~np.isnan(nxt)) if (~np.isnan(nxt)).any() else np.nan
+        best, pick = None, lo
+        for b in range(lo, hi):
+            area = abs((a - cx)*(y[b] - y[a]) - (a - b)*(cy - y[a]))
+            score = (-np.inf if np.isnan(y[b]) else -1.0) if np.isnan(area) else area
+            if best is None or score > best:
+                best, pick = score, b
+        keep.append(pick)
+        a = pick
+    return keep + [n - 1]
+
+
+def check_lttb():
+    """Vectorized ``lttb`` picks the same points as a per-series, per-point loop."""
+    from core.trends import lttb
+    rng = np.random.default_rng(0)
+    bad = []
+    for n, n_out in ((2, 5), (10, 1), (10, 2), (10, 3), (11, 10), (129, 40), (500, 97), (1000, 999)):
+        y = rng.normal(size=(4, n)).cumsum(axis=1)
+        y[1, rng.random(n) < 0.3] = np.nan
+        y[2, n//3:n//2] = np.nan
+        got = lttb(y, n_out)
+        for r in range(len(y)):
+            want = _lttb_one(y[r], n_out)
+            if got[r].tolist() != want:
+                bad.append(f"lttb n={n} n_out={n_out} row {r}: first diff at "
+                           f"{next((k for k, (p, q) in enumerate(zip(got[r], want)) if p != q), len(want))}")
+    return bad
+
+
+def check_finder():
+    """``AffordabilityIndex`` queries equal a brute-force scan of every SA2 and month."""
+    from core.cube import PanelCube
+    from core.finder import METRICS, AffordabilityIndex
+    from core.synthetic import simulate
+    codes, periods, fields = simulate(n_sa2=40)
+    rng = np.random.default_rng(0)
+    for f in fields.values():
+        f[rng.random(f.shape) < 0.02] = np.nan
+    index = AffordabilityIndex(PanelCube.from_arrays(codes, periods, fields))
+    bad = []
+    for metric in METRICS:
+        v = index.values[metric]
+        for bedrooms in (1, 3):
+            c = index.coefficient(metric, bedrooms)
+            for ceiling in np.nanquantile(v*c, [0.0, 0.1, 0.5, 0.9]).tolist() + [0.0, np.inf]:
+                ok = v <= ceiling/c                                  # NaN compares False
+                t = len(periods) - 1
+                ids, vals = index.affordable(metric, bedrooms, ceiling, t)
+                want = sorted(np.flatnonzero(ok[:, t]), key=lambda i: v[i, t])
+                first = [int(np.argmax(row)) if row.any() else -1 for row in ok]
+                since = [int(len(row) - np.argmin(row[::-1])) if not row.all() else 0 for row in ok]
+                since = [s if row[-1] else -1 for s, row in zip(since, ok)]
+                where = f"{metric} bedrooms={bedrooms} ceiling={ceiling:.6g}"
+                if ids.tolist() != want or not np.array_equal(vals, v[want, t]*c):
+                    bad.append(f"affordable {where}")
+                if index.counts(metric, bedrooms, ceiling).tolist() != ok.sum(axis=0).tolist():
+                    bad.append(f"counts {where}")
+                if index.first_months(metric, bedrooms, ceiling).tolist() != first:
+                    bad.append(f"first_months {where}")
+                if index.since_months(metric, bedrooms, ceiling).tolist() != since:
+                    bad.append(f"since_months {where}")
+    return bad
+
+
+def check_rollups():
+    """Rollups, built at once or updated month by month, equal a pandas groupby."""
+    import pandas as pd
+    from core.cube import PanelCube
+    from core.hierarchy import Hierarchy
+    from core.rollup import ROLLUP_FIELDS, ROLLUP_LEVELS, Rollups, sa2_fields
+    from core.synthetic import simulate
+    codes, periods, fields = simulate(n_sa2=60)
+    rng = np.random.default_rng(0)
+    for f in fields.values():
+        f[rng.random(f.shape) < 0.05] = np.nan
+    cube = PanelCube.from_arrays(codes, periods, fields)
+    frame = Hierarchy.synthetic(codes).frame.iloc[2:]                 # two SA2s outside every region
+    hierarchy = Hierarchy(frame.assign(weight=rng.integers(1, 9, len(frame))))
+    built = Rollups.build(cube, hierarchy)
+    updated = Rollups.build(PanelCube.from_arrays(codes, periods[:-3], {k: v[:, :-3] for k, v in fields.items()}),
+                            hierarchy)
+    updated.update(cube)
+    x = sa2_fields(cube.values, list(cube.fields))
+    long = pd.DataFrame({"SA2_CODE": np.repeat(codes, len(periods)), "t": np.tile(np.arange(len(periods)), len(codes)),
+                         **{f: x[..., k].ravel() for k, f in enumerate(ROLLUP_FIELDS)}})
+    long = long.merge(hierarchy.frame, on="SA2_CODE")
+    bad = []
+    for level in ROLLUP_LEVELS:
+        ids = pd.Index(hierarchy.regions(level))
+        for k, f in enumerate(ROLLUP_FIELDS):
+            ok = long[long[f].notna()]
+            g = ok.groupby([f"{level}_CODE", "t"])
+            wmean = (ok[f]*ok["weight"]).groupby([ok[f"{level}_CODE"], ok["t"]]).sum() / g["weight"].sum()
+            for stat, want in (("median", g[f].median()), ("wmean", wmean)):
+                full = np.full((len(ids), len(periods)), np.nan)
+                full[ids.get_indexer(want.index.get_level_values(0)), want.index.get_level_values(1)] = want
+                for name, r in (("build", built), ("update", updated)):
+                    if not np.allclose(r.values(level, f, stat), full, rtol=1e-12, atol=0, equal_nan=True):
+                        bad.append(f"{name} {level} {f} {stat}")
+            if k == 0:
+                count = np.zeros((len(ids), len(periods)), dtype=np.int32)
+                n = g.size()
+                count[ids.get_indexer(n.index.get_level_values(0)), n.index.get_level_values(1)] = n
+                if not np.array_equal(built.counts[level], count):
+                    bad.append(f"count {level}")
+    return bad
+
+
+def check_topology():
+    """Level 0 reproduces the input polygons; coarser levels shed vertices with arc ends pinned."""
+    from bench.run import synthetic_geojson
+    from core.topology import DECIMALS, LOD_TOLERANCES, Topology
+    gj = synthetic_geojson(60)
+    topo = Topology.from_geojson(gj)
+    stats = topo.stats()
+    bad = []
+    points = lambda f: sorted({tuple(p) for ring in f["geometry"]["coordinates"] for p in ring})
+    for i, (src, out) in enumerate(zip(gj["features"], topo.features(0))):
+        src = {"geometry": {"coordinates": [[[round(x, DECIMALS), round(y, DECIMALS)] for x, y in ring]
+                                            for ring in src["geometry"]["coordinates"]]}}
+        if points(src) != points(out):
+            bad.append(f"feature {i} differs at level 0")
+    if not stats["level_vertices"][0] < stats["raw_vertices"]:
+        bad.append(f"shared arcs not deduplicated: {stats['level_vertices'][0]} >= {stats['raw_vertices']} vertices")
+    counts = stats["level_vertices"]
+    if any(b > a for a, b in zip(counts, counts[1:])) or not counts[-1] < counts[0]:
+        bad.append(f"vertices per level not decreasing: {counts}")
+    for level in range(1, len(LOD_TOLERANCES)):
+        if any(not (np.array_equal(a[0], b[0]) and np.array_equal(a[-1], b[-1]))
+               for a, b in zip(topo.arcs, topo.level_arcs(level))):
+            bad.append(f"arc end points moved at level {level}")
+    return bad
+
+
+CHECKS = {
+    "synthetic": check_synthetic,
+    "scenarios": check_scenarios,
+    "sketch": check_sketch,
+    "lttb": check_lttb,
+    "finder": check_finder,
+    "rollups": check_rollups,
+    "topology": check_topology,
+}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("checks", nargs="*", help=f"subset of: {', '.join(CHECKS)}")
+    args = ap.parse_args(argv)
+    unknown = set(args.checks) - set(CHECKS)
+    if unknown:
+        ap.error(f"unknown checks {sorted(unknown)}; choose from {', '.join(CHECKS)}")
+    failed = 0
+    for name in args.checks or CHECKS:
+        bad = CHECKS[name]()
+        print(f"{'FAIL' if bad else 'ok  '} {name}")
+        for line in bad:
+            print("     ", line)
+        failed += bool(bad)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""Time the dashboard stages at several scales and check them against a baseline.
+
+Every stage the app runs per rerun is driven directly, without Streamlit or
+a browser: loading the synthetic panel, period filtering, the snapshot
+layers, per-metric values, the cap gap, both maps (built and serialized to
+JSON, as Streamlit sends them; the real map uses generated local polygons),
+the trend frames, a 50-SA2 weekly trend chart, an affordability finder
+query and the monthly update of the SA3/SA4/GCCSA rollups. Each case
+reports the best wall time over ``--repeat`` runs and the peak traced
+allocation of one extra run.
+
+    python -m bench.run                    # compare against bench/baseline.json
+    python -m bench.run --save-baseline    # record a new baseline
+    python -m bench.run --sizes 12,300 --years 10 --stages snap,cap_gap
+
+A case regresses when it is slower than ``--time-tol`` (relative) and
+``--min-ms`` (absolute) over its baseline, or uses more than ``--mem-tol``
+and ``--min-kb`` more memory; any regression makes the exit status 1.
+Baselines are machine-specific: record one on the machine that checks.
+"""
+import argparse
+import gc
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from core.cube import PRESET_YEARS
+from core.metrics import LAYERS, cap_gap, snapshot_layers
+from core.sources import SyntheticSource
+from core.synthetic import END
+from core.topology import Topology, level_for
+from core.trends import TrendStore
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+SIZES = (12, 300, 2500)
+YEARS = (3, 10, 20)          # history lengths, ending at the synthetic END
+BEDROOMS = 2
+FINANCE = dict(deposit_pct=20, interest=6.0, max_monthly=2500)
+TREND_POINTS = 700           # the app's default TREND_WIDTH_PX
+
+
+# ---------- local geometry ----------
+def synthetic_geojson(n, vertices_per_edge=16, seed=0):
+    """``n`` watertight polygons on a jittered lattice around Sydney, wavy shared edges."""
+    rng = np.random.default_rng(seed)
+    ncols = math.ceil(math.sqrt(n))
+    nrows = math.ceil(n / ncols)
+    nodes = np.stack(np.meshgrid(np.arange(ncols+1), np.arange(nrows+1), indexing="ij"), -1).astype(float)
+    nodes += rng.uniform(-0.2, 0.2, nodes.shape)
+    nodes = nodes*0.02 + np.array([150.6, -34.1])
+    t = np.linspace(0, 1, vertices_per_edge+1)[:, None]
+    edges = {}
+    def edge(p, q):
+        key = (p, q) if p < q else (q, p)
+        if key not in edges:
+            a, b = nodes[key[0]], nodes[key[1]]
+            normal = np.array([a[1]-b[1], b[0]-a[0]])
+            edges[key] = a + (b-a)*t + normal*0.04*np.sin(np.pi*t*rng.integers(1, 4))
+        return edges[key] if (p, q) == key else edges[key][::-1]
+    feats = []
+    for k in range(n):
+        i, j = divmod(k, nrows)
+        corners = [(i, j), (i+1, j), (i+1, j+1), (i, j+1)]
+        ring = np.vstack([edge(corners[m], corners[(m+1) % 4])[:-1] for m in range(4)])
+        ring = np.vstack([ring, ring[:1]])
+        feats.append({"type": "Feature", "properties": {"sa2_name_2021": f"B{k:04d}"},
+                      "geometry": {"type": "Polygon", "coordinates": [np.round(ring, 5).tolist()]}})
+    return {"type": "FeatureCollection", "features": feats}
+
+
+# ---------- stages ----------
+# name -> (uses history?, setup(n_sa2, years) -> zero-argument callable)
+def _cube(n, years):
+    start = date(END.year - years, END.month, 1)
+    return SyntheticSource(n, start=start).cube()
+
+
+def _load(n, years):
+    source = SyntheticSource(n, start=date(END.year - years, END.month, 1))
+    return source.cube
+
+
+def _period_filter(n, years):
+    cube = _cube(n, years)
+    return lambda: [(cube.window(p), cube.window_labels(p)) for p in PRESET_YEARS]
+
+
+def _snap(n, years):
+    cube = _cube(n, years)
+    return lambda: snapshot_layers(cube, BEDROOMS, **FINANCE)
+
+
+def _value_for_metric(n, years):
+    layers = snapshot_layers(_cube(n, years), BEDROOMS, **FINANCE)
+    return lambda: [(layers.values(m), layers.color_range(m)) for m in LAYERS]
+
+
+def _cap_gap(n, years):
+    price_adj = snapshot_layers(_cube(n, years), BEDROOMS).columns["MedianPrice_adj"]
+    return lambda: cap_gap(price_adj, **FINANCE)
+
+
+def _map_grid(n, years):
+    from figures import fig_to_json, map_grid_fig
+    cube = _cube(n, years)
+    layers, grid = snapshot_layers(cube, BEDROOMS), cube.grid()
+    vals = layers.values("PTI")
+    vmin, vmax = layers.color_range("PTI")
+    return lambda: fig_to_json(map_grid_fig(grid, vals, "PTI", vmin, vmax, True, cube.codes[0]))
+
+
+def _map_real(n, years):
+    from figures import fig_to_json, map_real_fig
+    cube = _cube(n, years)
+    layers = snapshot_layers(cube, BEDROOMS)
+    topo = Topology.from_geojson(synthetic_geojson(n))
+    feats = topo.to_geojson(level_for(n))["features"]
+    vals = dict(zip(layers.codes, layers.values("PTI")))
+    vmin, vmax = layers.color_range("PTI")
+    return lambda: fig_to_json(map_real_fig(feats, layers.codes, vals, "PTI", vmin, vmax, True))
+
+
+def _trend_store(n, years):
+    cube = _cube(n, years)
+    return lambda: TrendStore(cube, BEDROOMS)
+
+
+def _ts_with_median(n, years):
+    cube = _cube(n, years)
+    store = TrendStore(cube, BEDROOMS)
+    selection = tuple(cube.codes[:3])
+    return lambda: [store.frame(key, preset, selection) for key in ("Rent", "Price", "PTI", "RTI")
+                    for preset in PRESET_YEARS]
+
+
+def _trend_fig(n, years):
+    """50 SA2s (or all) over weekly history, decimated and in WebGL as the app draws large selections."""
+    from figures import RTI_BANDS, fig_to_json, ts_fig
+    cube = SyntheticSource(n, freq="W", start=date(END.year - years, END.month, 1)).cube()
+    frame = TrendStore(cube, BEDROOMS).frame("RTI", "Max", tuple(cube.codes[:50]))
+    return lambda: fig_to_json(ts_fig(frame, "RTI", RTI_BANDS, max_points=TREND_POINTS, webgl=True, band=True))
+
+
+def _finder(n, years):
+    """A buyer budget against every SA2 and month: ranked list plus timeline, index prebuilt."""
+    from core.finder import AffordabilityIndex
+    index = AffordabilityIndex(_cube(n, years))
+    ceiling = float(np.nanmedian(index.values["price"][:, -1]))   # about half the SA2s affordable
+    index.search("price", BEDROOMS, ceiling)
+    return lambda: (index.search("price", BEDROOMS, ceiling), index.timeline("price", BEDROOMS, ceiling))
+
+
+def _rollup_update(n, years):
+    """A new month arriving: rollups of all earlier months are reused, one month is aggregated."""
+    from core.cube import PanelCube
+    from core.hierarchy import Hierarchy
+    from core.rollup import Rollups
+    cube = _cube(n, years)
+    hierarchy = Hierarchy.synthetic(cube.codes)
+    before = Rollups.build(PanelCube(cube.values[:, :-1], cube.codes, cube.periods[:-1], cube.fields), hierarchy)
+    def update():
+        r = Rollups(hierarchy, cube.codes, before.labels, before.digests, before.data, before.counts)
+        return r.update(cube)
+    return update
+
+
+STAGES = {
+    "load_synthetic": (True, _load),
+    "period_filter": (True, _period_filter),
+    "snap": (False, _snap),
+    "value_for_metric": (False, _value_for_metric),
+    "cap_gap": (False, _cap_gap),
+    "map_grid_fig": (False, _map_grid),
+    "map_real_fig": (False, _map_real),
+    "trend_store": (True, _trend_store),
+    "ts_with_median": (True, _ts_with_median),
+    "trend_fig": (True, _trend_fig),
+    "finder": (True, _finder),
+    "rollup_update": (True, _rollup_update),
+}
+
+
+# ---------- measurement ----------
+def measure(fn, repeat):
+    """``(best wall seconds, peak traced bytes)``; memory comes from one extra traced run."""
+    fn()  # warm-up: imports, first-touch allocations
+    best = math.inf
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def cases(stages, sizes, years):
+    """``(case key, stage, n_sa2, years)``; history-free stages run at the longest history only."""
+    for stage in stages:
+        uses_history = STAGES[stage][0]
+        for n in sizes:
+            for y in (years if uses_history else years[-1:]):
+                key = f"{stage}/sa2={n}" + (f"/years={y}" if uses_history else "")
+                yield key, stage, n, y
+
+
+def run(stages, sizes, years, repeat):
+    results = {}
+    for key, stage, n, y in cases(stages, sizes, years):
+        seconds, peak = measure(STAGES[stage][1](n, y), repeat)
+        results[key] = {"ms": seconds*1e3, "peak_kb": peak/1024}
+        print(f"{key:40s} {seconds*1e3:10.2f} ms {peak/1024:12,.0f} kB", flush=True)
+    return results
+
+
+def compare(results, baseline, time_tol, mem_tol, min_ms, min_kb):
+    """Lines describing regressions (empty when everything is within tolerance)."""
+    bad = []
+    for key, r in results.items():
+        b = baseline.get(key)
+        if b is None:
+            continue
+        if r["ms"] > b["ms"]*(1+time_tol) and r["ms"] - b["ms"] > min_ms:
+            bad.append(f"{key}: {r['ms']:.2f} ms vs baseline {b['ms']:.2f} ms")
+        if r["peak_kb"] > b["peak_kb"]*(1+mem_tol) and r["peak_kb"] - b["peak_kb"] > min_kb:
+            bad.append(f"{key}: peak {r['peak_kb']:,.0f} kB vs baseline {b['peak_kb']:,.0f} kB")
+    return bad
+
+
+def environment():
+    import pandas as pd
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "machine": platform.machine(), "system": platform.system()}
+
+
+def main(argv=None):
+    ints = lambda s: tuple(int(x) for x in s.split(","))
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", type=ints, default=SIZES, help="SA2 counts, comma-separated")
+    ap.add_argument("--years", type=ints, default=YEARS, help="history lengths in years, comma-separated")
+    ap.add_argument("--stages", type=lambda s: tuple(s.split(",")), default=tuple(STAGES))
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--save-baseline", action="store_true", help="write results as the new baseline")
+    ap.add_argument("--time-tol", type=float, default=0.5, help="allowed relative slowdown")
+    ap.add_argument("--mem-tol", type=float, default=0.25, help="allowed relative memory growth")
+    ap.add_argument("--min-ms", type=float, default=2.0, help="ignore slowdowns smaller than this")
+    ap.add_argument("--min-kb", type=float, default=256.0, help="ignore memory growth smaller than this")
+    ap.add_argument("--out", type=Path, help="also write results as JSON")
+    args = ap.parse_args(argv)
+
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        ap.error(f"unknown stages {sorted(unknown)}; choose from {', '.join(STAGES)}")
+    results = run(args.stages, args.sizes, args.years, args.repeat)
+    report = {"environment": environment(), "results": results}
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=1))
+    if args.save_baseline:
+        saved = json.loads(args.baseline.read_text())["results"] if args.baseline.exists() else {}
+        report["results"] = {**saved, **results}
+        args.baseline.write_text(json.dumps(report, indent=1, sort_keys=True) + "\n")
+        print(f"baseline written: {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; run with --save-baseline first")
+        return 0
+    baseline = json.loads(args.baseline.read_text())["results"]
+    bad = compare(results, baseline, args.time_tol, args.mem_tol, args.min_ms, args.min_kb)
+    missing = [k for k in results if k not in baseline]
+    if missing:
+        print(f"{len(missing)} case(s) not in the baseline: {', '.join(missing)}")
+    for line in bad:
+        print("REGRESSION", line)
+    print(f"{len(results)} cases checked, {len(bad)} regression(s)")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
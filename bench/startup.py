@@ -0,0 +1,85 @@
+"""Cold-start timings: import cost of ``core``/``figures`` and time to first render.
+
+Each measurement runs in a fresh interpreter, so nothing is warm in-process
+(the OS file cache still is; the best of ``--repeat`` runs is reported).
+First render runs the whole script once through Streamlit's headless
+AppTest, with generated local polygons so no network is touched.
+
+    python -m bench.startup
+
+Exits 1 if ``import core`` pulls in anything beyond NumPy and pandas
+(plotly, requests, streamlit), i.e. if the batch-job core stops being headless.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+UI_MODULES = ("plotly", "plotly.express", "requests", "streamlit", "streamlit_plotly_events")
+
+IMPORT = """
+import json, sys, time
+t = time.perf_counter()
+import {module}
+print(json.dumps({{"ms": (time.perf_counter() - t)*1e3,
+                   "loaded": [m for m in {ui!r} if m in sys.modules]}}))
+"""
+
+FIRST_RENDER = """
+import json, logging, time
+t = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+logging.disable(logging.WARNING)
+t_import = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=300).run()
+assert not at.exception, [e.value for e in at.exception]
+print(json.dumps({{"ms": (time.perf_counter() - t)*1e3, "streamlit_ms": (t_import - t)*1e3,
+                   "charts": len(at.get("plotly_chart"))}}))
+"""
+
+
+def run_snippet(code, env=None, repeat=3):
+    """Best (lowest ``ms``) JSON result of ``code`` over fresh interpreters."""
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env={**os.environ, **(env or {})},
+                             capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        best = r if best is None or r["ms"] < best["ms"] else best
+    return best
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--sa2", type=int, default=12, help="polygons in the generated local geometry")
+    args = ap.parse_args(argv)
+
+    results = {m: run_snippet(IMPORT.format(module=m, ui=UI_MODULES), repeat=args.repeat)
+               for m in ("core", "figures")}
+    for m, r in results.items():
+        print(f"import {m:28s} {r['ms']:8.0f} ms   loads: {', '.join(r['loaded']) or '-'}")
+
+    from bench.run import synthetic_geojson
+    with tempfile.TemporaryDirectory() as tmp:
+        geo = Path(tmp) / "sa2.geojson"
+        geo.write_text(json.dumps(synthetic_geojson(args.sa2)))
+        env = {"SA2_GEOJSON": str(geo), "SA2_GEO_CACHE": str(Path(tmp) / "cache")}
+        r = run_snippet(FIRST_RENDER.format(app=str(ROOT / "app.py")), env, args.repeat)
+    print(f"first render (incl. imports)        {r['ms']:8.0f} ms   "
+          f"(streamlit import {r['streamlit_ms']:.0f} ms, app script {r['ms'] - r['streamlit_ms']:.0f} ms, "
+          f"{r['charts']} charts)")
+
+    leaked = results["core"]["loaded"]
+    if leaked:
+        print(f"core is not headless: importing it loads {', '.join(leaked)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""UI-free building blocks for the housing affordability dashboard."""
+from .synthetic import mulberry32, mulberry32_array, range_months, simulate, generate_panel
+from .cube import FIELDS, PanelCube
+from .finance import (annuity_monthly, principal_from_monthly, annuity_monthly_array,
+                      principal_from_monthly_array, scenario_grid, sensitivity)
+from .metrics import LAYERS, MetricLayers, cap_gap, compute_layers, snapshot_layers
+from .sources import ArrowSource, PanelSource, SyntheticSource, open_source, write_panel
+from .ingest import SketchSource
+from .batch import PROFILES, affordability_rows
+from .finder import AffordabilityIndex, price_ceiling, rent_ceiling
+from .figcache import FigureCache
+from .geometry import GeometryStore, load_geometry
+from .topology import Topology, level_for
+from .trends import SERIES, TrendStore
+from .hierarchy import LEVELS, Hierarchy
+from .rollup import Rollups
+from .stages import STAGES, stage_args, stage_inputs
+
+__all__ = ["mulberry32", "mulberry32_array", "range_months", "simulate", "generate_panel",
+           "FIELDS", "PanelCube", "annuity_monthly", "principal_from_monthly",
+           "annuity_monthly_array", "principal_from_monthly_array", "scenario_grid", "sensitivity",
+           "LAYERS", "MetricLayers", "cap_gap", "compute_layers", "snapshot_layers",
+           "STAGES", "stage_args", "stage_inputs", "GeometryStore", "load_geometry",
+           "Topology", "level_for", "SERIES", "TrendStore",
+           "PanelSource", "SyntheticSource", "ArrowSource", "open_source", "write_panel",
+           "SketchSource", "FigureCache", "PROFILES", "affordability_rows",
+           "AffordabilityIndex", "price_ceiling", "rent_ceiling", "LEVELS", "Hierarchy", "Rollups"]
@@ -0,0 +1,78 @@
+"""Affordability for every SA2 x bedroom count x buyer profile.
+
+The comparison-table columns come from ``adjusted_columns``; payment, MTI,
+cap gap and affordable price per profile come from ``scenario_grid``, so
+each row equals what the table and the buyer panel show for that SA2,
+bedroom count and sidebar setting. Rows are computed for any subset of SA2s
+at a time, which lets a batch job split the city into chunks.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from .finance import scenario_grid
+from .metrics import CAP_GAP_YEARS, PRICE_BEDROOM_COEFFS, RENT_BEDROOM_COEFFS, adjusted_columns
+
+BEDROOMS = tuple(sorted(set(RENT_BEDROOM_COEFFS) | set(PRICE_BEDROOM_COEFFS)))
+PROFILE_FIELDS = ("income", "deposit_pct", "interest", "mortgage_years", "max_monthly")
+
+# standard buyer profiles; "median" is the dashboard's sidebar defaults
+PROFILES = {
+    "first_home_single": dict(income=70000, deposit_pct=10, interest=6.0, mortgage_years=30, max_monthly=1800),
+    "median": dict(income=95000, deposit_pct=20, interest=6.0, mortgage_years=25, max_monthly=2500),
+    "dual_income": dict(income=160000, deposit_pct=20, interest=6.0, mortgage_years=30, max_monthly=4000),
+    "upgrader": dict(income=220000, deposit_pct=30, interest=6.0, mortgage_years=25, max_monthly=5500),
+}
+
+REPORT_COLUMNS = ["SA2_CODE", "bedrooms", "profile", "MedianPrice_adj", "MedianRent_week_adj",
+                  "MedianIncome_annual", "PTI", "RTI", "gap", "payment", "MTI", "RTI_profile",
+                  "affordable_price"]
+
+
+def load_profiles(path):
+    """Profiles from a JSON object ``{name: {income, deposit_pct, interest, mortgage_years, max_monthly}}``."""
+    with open(path) as f:
+        profiles = json.load(f)
+    for name, p in profiles.items():
+        missing = [f for f in PROFILE_FIELDS if f not in p]
+        if missing:
+            raise ValueError(f"profile {name!r} is missing {', '.join(missing)}")
+    return {name: {f: float(p[f]) for f in PROFILE_FIELDS} for name, p in profiles.items()}
+
+
+def affordability_rows(codes, price, rent_week, income, bedrooms=BEDROOMS, profiles=PROFILES):
+    """One row per (SA2, bedrooms, profile), SA2s outermost within each block.
+
+    ``price``, ``rent_week`` and ``income`` are the raw SA2 medians aligned
+    with ``codes``. ``RTI`` uses the SA2's median income, as the comparison
+    table does. ``RTI_profile`` uses the profile's income, as the renter
+    panel does. ``gap`` uses the fixed ``CAP_GAP_YEARS`` term.
+    """
+    codes = np.asarray(codes, dtype=object)
+    n = len(codes)
+    blocks = []
+    for b in bedrooms:
+        cols = adjusted_columns(price, rent_week, income, b)
+        for name, p in profiles.items():
+            grid = scenario_grid(cols["MedianPrice_adj"], p["income"], [p["interest"]],
+                                 [p["mortgage_years"]], [p["deposit_pct"]], p["max_monthly"],
+                                 cap_years=CAP_GAP_YEARS)
+            blocks.append(pd.DataFrame({
+                "SA2_CODE": codes, "bedrooms": np.full(n, b, dtype=np.int8), "profile": name,
+                **cols, "gap": grid["gap"].ravel(), "payment": grid["payment"].ravel(),
+                "MTI": grid["mti"].ravel(),
+                "RTI_profile": cols["MedianRent_week_adj"]*52/max(1e-9, p["income"]),
+                "affordable_price": np.broadcast_to(grid["affordable_price"].ravel(), n),
+            }))
+    out = pd.concat(blocks, ignore_index=True)[REPORT_COLUMNS]
+    out["profile"] = pd.Categorical(out["profile"], categories=list(profiles))
+    return out
+
+
+def cube_rows(cube, bedrooms=BEDROOMS, profiles=PROFILES, t=-1):
+    """:func:`affordability_rows` for every SA2 of ``cube`` at period ``t``."""
+    snap = cube.snapshot(t)
+    f = cube.field_index
+    return affordability_rows(cube.codes, snap[:, f("MedianPrice")], snap[:, f("MedianRent_week")],
+                              snap[:, f("MedianIncome_annual")], bedrooms, profiles)
@@ -0,0 +1,108 @@
+"""Array-backed SA2 x period x field panel.
+
+The long ``date/SA2_CODE`` frame is replaced by one contiguous
+``(n_sa2, n_periods, n_fields)`` array. SA2s are a categorical dimension
+(integer ids), periods are integer offsets, so period presets and the latest
+snapshot are plain slices that share memory with the cube.
+"""
+import numpy as np
+import pandas as pd
+
+from .synthetic import PERIODS_PER_YEAR, grid_layout, period_labels, simulate
+
+FIELDS = ("MedianPrice", "MedianRent_week", "MedianIncome_annual")
+PRESET_YEARS = {"Max": None, "5y": 5, "3y": 3, "1y": 1}
+
+
+class PanelCube:
+    """Panel values indexed by ``[sa2_id, period_offset, field]``."""
+
+    def __init__(self, values, codes, periods, fields=FIELDS, freq="M"):
+        values = np.ascontiguousarray(values)
+        if values.shape != (len(codes), len(periods), len(fields)):
+            raise ValueError(f"values shape {values.shape} does not match "
+                             f"({len(codes)}, {len(periods)}, {len(fields)})")
+        values.flags.writeable = False
+        self.values = values
+        self.sa2 = pd.CategoricalIndex(codes, categories=list(codes), name="SA2_CODE")
+        self.periods = list(periods)
+        self.labels = period_labels(self.periods, freq)
+        self.fields = tuple(fields)
+        self.freq = freq
+
+    # ---------- construction ----------
+    @classmethod
+    def from_arrays(cls, codes, periods, arrays, freq="M", dtype=np.float64):
+        fields = tuple(arrays)
+        values = np.empty((len(codes), len(periods), len(fields)), dtype=dtype)
+        for i, f in enumerate(fields):
+            values[:, :, i] = arrays[f]
+        return cls(values, codes, periods, fields, freq)
+
+    @classmethod
+    def synthetic(cls, n_sa2=12, freq="M", dtype=np.float64, **kwargs):
+        codes, periods, arrays = simulate(n_sa2=n_sa2, freq=freq, **kwargs)
+        return cls.from_arrays(codes, periods, arrays, freq, dtype)
+
+    @classmethod
+    def from_long(cls, df, periods, fields=FIELDS, freq="M", dtype=np.float64):
+        """Pivot a long ``date/SA2_CODE`` frame; missing cells become NaN."""
+        codes = pd.Categorical(df["SA2_CODE"])
+        labels = period_labels(periods, freq)
+        t = pd.Index(labels).get_indexer(df["date"])
+        keep = t >= 0
+        values = np.full((len(codes.categories), len(periods), len(fields)), np.nan, dtype=dtype)
+        values[codes.codes[keep], t[keep], :] = df.loc[keep, list(fields)].to_numpy(dtype)
+        return cls(values, list(codes.categories), periods, fields, freq)
+
+    # ---------- dimensions ----------
+    @property
+    def codes(self):
+        return list(self.sa2.categories)
+
+
+    def grid(self):
+        return grid_layout(self.codes)
+
+    def ids(self, codes):
+        """Integer SA2 ids for ``codes`` (-1 where unknown)."""
+        return self.sa2.categories.get_indexer(list(codes))
+
+    def field_index(self, name):
+        return self.fields.index(name)
+
+    # ---------- slicing (views, no copies) ----------
+    def preset_start(self, preset):
+        years = PRESET_YEARS[preset]
+        end_idx = len(self.periods) - 1
+        return 0 if years is None else max(0, end_idx - years*PERIODS_PER_YEAR[self.freq])
+
+    def window(self, preset="Max"):
+        """``(n_sa2, n_window, n_fields)`` view over the preset's periods."""
+        return self.values[:, self.preset_start(preset):, :]
+
+    def window_labels(self, preset="Max"):
+        return self.labels[self.preset_start(preset):]
+
+    def snapshot(self, t=-1):
+        """``(n_sa2, n_fields)`` view at period offset ``t`` (latest by default)."""
+        return self.values[:, t, :]
+
+    def series(self, field, preset="Max"):
+        """``(n_sa2, n_window)`` view of one field."""
+        return self.window(preset)[:, :, self.field_index(field)]
+
+    def rows(self, start, stop):
+        """Cube of SA2s ``start:stop``, sharing this cube's values."""
+        return PanelCube(self.values[start:stop], self.codes[start:stop], self.periods, self.fields, self.freq)
+
+    # ---------- interop ----------
+    def to_long(self, preset="Max"):
+        w = self.window(preset)
+        labels = np.array(self.window_labels(preset), dtype=object)
+        n, T = w.shape[:2]
+        return pd.DataFrame({
+            "date": np.tile(labels, n),
+            "SA2_CODE": np.repeat(np.array(self.codes, dtype=object), T),
+            **{f: w[:, :, i].ravel() for i, f in enumerate(self.fields)},
+        })
@@ -0,0 +1,112 @@
+"""Process-wide LRU cache for built figures and tables.
+
+Entries are keyed on a digest of the exact builder inputs (arrays hashed by
+content), held as serialized figure JSON or frames, and evicted least
+recently used once their total size passes ``max_bytes``.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get("FIG_CACHE_MB", 256)) * 2**20)
+
+
+def digest(*parts):
+    """Stable hex digest of builder inputs; arrays and frames hash by content."""
+    h = hashlib.blake2b(digest_size=16)
+    def feed(x):
+        if isinstance(x, np.ndarray):
+            h.update(f"nd{x.dtype}{x.shape}".encode())
+            h.update(np.ascontiguousarray(x).tobytes())
+        elif isinstance(x, (pd.DataFrame, pd.Series)):
+            h.update(f"pd{list(x.columns) if isinstance(x, pd.DataFrame) else x.name}".encode())
+            h.update(pd.util.hash_pandas_object(x, index=True).to_numpy().tobytes())
+        elif isinstance(x, (list, tuple)):
+            h.update(f"seq{len(x)}(".encode())
+            for y in x:
+                feed(y)
+            h.update(b")")
+        elif isinstance(x, dict):
+            feed(sorted(x.items(), key=lambda kv: str(kv[0])))
+        else:
+            h.update(f"{type(x).__name__}:{x!r};".encode())
+    for p in parts:
+        feed(p)
+    return h.hexdigest()
+
+
+def sizeof(value):
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, tuple):
+        return sum(sizeof(v) for v in value)
+    return 64
+
+
+class FigureCache:
+    """Thread-safe LRU bounded by total entry size, with hit/miss counters."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (value, nbytes)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return hit[0]
+
+    def put(self, key, value, nbytes=None):
+        nbytes = sizeof(value) if nbytes is None else nbytes
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return value   # too big to keep; the caller still gets it
+            self._entries[key] = (value, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, size) = self._entries.popitem(last=False)
+                self.bytes -= size
+                self.evictions += 1
+        return value
+
+    def fetch(self, key, build):
+        """``(value, hit)``: the cached value for ``key``, else ``build()`` stored under it.
+
+        Builds run outside the lock, so two sessions missing together may
+        both build; the second put simply replaces the first.
+        """
+        value = self.get(key)
+        if value is None:
+            return self.put(key, build()), False
+        return value, True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits/total if total else 0.0}
@@ -0,0 +1,125 @@
+"""Mortgage formulas: scalar versions for the panels, broadcasting ones for scenario grids."""
+import numpy as np
+
+
+def annuity_monthly(L, r_annual, years):
+    L = max(0.0, float(L)); m = float(r_annual)/12.0; n = max(1, int(round(years*12)))
+    if L == 0: return 0.0
+    if m == 0: return L / n
+    return (m*L) / (1 - (1+m)**(-n))
+
+
+def principal_from_monthly(payment, r_annual, years):
+    m = float(r_annual)/12.0; n = max(1, int(round(years*12)))
+    if m == 0: return float(payment)*n
+    return float(payment) * (1 - (1+m)**(-n)) / m
+
+
+# ---------- vectorized scenario engine ----------
+SCENARIO_AXES = ("sa2", "rate", "term", "deposit")
+SCENARIO_OUTPUTS = ("payment", "mti", "gap", "affordable_price")
+
+
+def _n_periods(years):
+    return np.maximum(1, np.rint(np.asarray(years, dtype=float)*12).astype(np.int64))
+
+
+def _discount(m, n):
+    """``(1+m)**(-n)`` evaluated once per distinct (m, n) pair with Python floats.
+
+    Rate and term grids are small, so this keeps the scalar functions' exact
+    pow() results without paying for it per scenario.
+    """
+    m, n = np.broadcast_arrays(m, n)
+    pairs, inv = np.unique(np.stack([m.ravel(), n.ravel().astype(float)]), axis=1, return_inverse=True)
+    table = np.array([(1+a)**(-int(b)) for a, b in pairs.T])
+    return table[inv.ravel()].reshape(m.shape)
+
+
+def annuity_monthly_array(L, r_annual, years):
+    """Broadcasting :func:`annuity_monthly`; equal to it element by element."""
+    L = np.maximum(0.0, np.asarray(L, dtype=float))
+    m = np.asarray(r_annual, dtype=float)/12.0
+    n = _n_periods(years)
+    f = _discount(m, n)
+    m, n, f = np.broadcast_arrays(m, n, f)
+    zero_rate = m == 0
+    # full-size work happens in place on `out`; masks stay at their small broadcast shapes
+    out = m*L
+    np.divide(out, 1 - f, out=out, where=~zero_rate)
+    np.divide(L, n, out=out, where=zero_rate)
+    np.copyto(out, 0.0, where=L == 0)
+    return out
+
+
+def principal_from_monthly_array(payment, r_annual, years):
+    """Broadcasting :func:`principal_from_monthly`; equal to it element by element."""
+    payment = np.asarray(payment, dtype=float)
+    m = np.asarray(r_annual, dtype=float)/12.0
+    n = _n_periods(years)
+    f = _discount(m, n)
+    m, n, f = np.broadcast_arrays(m, n, f)
+    zero_rate = m == 0
+    out = payment * (1 - f)
+    np.divide(out, m, out=out, where=~zero_rate)
+    np.multiply(payment, n, out=out, where=zero_rate)
+    return out
+
+
+def scenario_grid(price_adj, income, rates, terms, deposits, max_monthly, cap_years=None,
+                  outputs=SCENARIO_OUTPUTS):
+    """Affordability over every (SA2 x rate x term x deposit) combination.
+
+    ``price_adj`` is per SA2 (size-adjusted), ``income`` a scalar or per SA2,
+    ``rates`` in %/yr, ``terms`` in years and ``deposits`` in %, as in the
+    sidebar. Results are float64 arrays on the ``SCENARIO_AXES`` axes (axes a
+    result does not depend on have length 1), computed exactly as the buyer
+    panel does: ``payment`` on the loan after deposit, ``mti`` its income
+    share, ``gap`` the payment cap gap with the cap loan taken over
+    ``cap_years`` (the scenario term when None) and ``affordable_price`` the
+    price the monthly cap supports.
+    """
+    price = np.asarray(price_adj, dtype=float).reshape(-1, 1, 1, 1)
+    income = np.asarray(income, dtype=float).reshape(-1, 1, 1, 1)
+    r = np.asarray(rates, dtype=float).reshape(1, -1, 1, 1)/100.0
+    years = np.asarray(terms, dtype=float).reshape(1, 1, -1, 1)
+    dep = np.asarray(deposits, dtype=float).reshape(1, 1, 1, -1)
+
+    out = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        _fill_scenarios(out, price, income, r, years, dep, max_monthly, cap_years, outputs)
+    return out
+
+
+def _fill_scenarios(out, price, income, r, years, dep, max_monthly, cap_years, outputs):
+    if "payment" in outputs or "mti" in outputs:
+        deposit_target = dep/100 * price
+        loan = np.maximum(0.0, price - deposit_target)
+        payment = annuity_monthly_array(loan, r, years)
+        if "payment" in outputs:
+            out["payment"] = payment
+        if "mti" in outputs:
+            mti = payment*12
+            mti /= np.maximum(1e-9, income)
+            out["mti"] = mti
+    if "gap" in outputs:
+        cap_loan = principal_from_monthly_array(max_monthly, r, years if cap_years is None else cap_years)
+        L_needed = price*(1-dep/100.0)
+        gap = L_needed - cap_loan
+        gap /= price
+        out["gap"] = gap
+    if "affordable_price" in outputs:
+        cap_user = principal_from_monthly_array(max_monthly, r, years)
+        out["affordable_price"] = cap_user / np.maximum(1e-9, 1 - dep/100.0)
+
+
+def sensitivity(grid, x_axis, y_axis, at):
+    """2-D slice of a ``scenario_grid`` result: ``y_axis`` rows by ``x_axis`` columns.
+
+    ``at`` gives the index to take on each remaining axis (default 0).
+    """
+    x, y = SCENARIO_AXES.index(x_axis), SCENARIO_AXES.index(y_axis)
+    idx = tuple(slice(None) if a in (x, y) else min(at.get(SCENARIO_AXES[a], 0), grid.shape[a]-1)
+                for a in range(len(SCENARIO_AXES)))
+    z = np.broadcast_to(grid, grid.shape)[idx]
+    return z if y < x else z.T
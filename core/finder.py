@@ -0,0 +1,155 @@
+"""Indexed "where can I afford?" queries over every SA2 and month.
+
+For each metric (price, weekly rent, PTI, RTI) the index keeps, per month,
+the SA2s sorted by value, and per SA2 the running minimum from the first
+month and the running maximum back from the last. All three are monotone,
+so a budget is answered by binary search instead of a scan:
+
+- SA2s affordable in month ``t``: one ``searchsorted`` on month ``t``'s
+  sorted row, giving them already ranked cheapest first;
+- how many are affordable each month: a binary search per month row;
+- first month an SA2 was affordable: the first month its running minimum
+  is within budget; affordable since: the first month from which its
+  running maximum to the end is.
+
+Bedroom counts only scale price and rent (and so PTI and RTI) by a
+positive coefficient, which keeps every order, so one index serves all
+bedroom settings: budgets are divided by the coefficient instead. Missing
+values are stored as +inf and budgets are capped below it, so they count
+as unaffordable even against an unbounded budget.
+"""
+import numpy as np
+import pandas as pd
+
+from .finance import principal_from_monthly
+from .metrics import PRICE_BEDROOM_COEFFS, RENT_BEDROOM_COEFFS
+
+METRICS = ("price", "rent", "PTI", "RTI")
+
+
+def price_ceiling(income, savings, deposit_pct, interest, mortgage_years, max_monthly, max_mti=None):
+    """Highest size-adjusted price the buyer can take on.
+
+    The loan is limited by the monthly cap (and by ``max_mti`` of income
+    when given) at the sidebar rate and term; the deposit by savings.
+    """
+    payment = float(max_monthly)
+    if max_mti is not None:
+        payment = min(payment, float(income)*max_mti/12)
+    loan = principal_from_monthly(payment, interest/100.0, mortgage_years)
+    price = loan / max(1e-9, 1 - deposit_pct/100.0)
+    if deposit_pct > 0:
+        price = min(price, float(savings) / (deposit_pct/100.0))
+    return price
+
+
+def rent_ceiling(income, max_rti=0.30):
+    """Highest weekly rent within ``max_rti`` of annual income."""
+    return float(income)*max_rti/52
+
+
+def _count_below(rows, x, strict=False, which=None):
+    """Per row of ascending ``rows``, how many entries are ``<= x`` (``< x`` when ``strict``).
+
+    A binary search on every row (or the rows ``which``) at once:
+    ``log2(width)`` vectorized steps.
+    """
+    width = rows.shape[1]
+    r = np.arange(rows.shape[0]) if which is None else np.asarray(which)
+    lo = np.zeros(len(r), dtype=np.int64)
+    hi = np.full(len(r), width, dtype=np.int64)
+    for _ in range(int(width).bit_length()):
+        mid = (lo + hi) // 2
+        v = rows[r, np.minimum(mid, width - 1)]
+        below = (lo < hi) & ((v < x) if strict else (v <= x))
+        lo = np.where(below, mid + 1, lo)
+        hi = np.where(below, hi, mid)
+    return lo
+
+
+class AffordabilityIndex:
+    """Sorted per-month and monotone per-SA2 views of the four finder metrics."""
+
+    def __init__(self, cube):
+        self.cube = cube
+        self.codes = np.array(cube.codes, dtype=object)
+        price = cube.series("MedianPrice")
+        rent = cube.series("MedianRent_week")
+        income = cube.series("MedianIncome_annual")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.values = {"price": price, "rent": rent, "PTI": price/income, "RTI": rent*52/income}
+        self._built = {}
+
+    @staticmethod
+    def coefficient(metric, bedrooms):
+        coeffs = PRICE_BEDROOM_COEFFS if metric in ("price", "PTI") else RENT_BEDROOM_COEFFS
+        return coeffs.get(bedrooms, 1.0)
+
+    def limit(self, metric, bedrooms, ceiling):
+        """``ceiling`` on the unadjusted scale, kept below the +inf that marks missing values."""
+        return min(ceiling / self.coefficient(metric, bedrooms), np.finfo(float).max)
+
+    def _index(self, metric):
+        """``(order, sorted, -running_min, -running_max_to_end)``, built on first use.
+
+        The running extremes are stored negated, so every array is ascending.
+        """
+        if metric not in self._built:
+            v = self.values[metric]
+            v = np.where(np.isnan(v), np.inf, v)
+            order = np.argsort(v.T, axis=1, kind="stable")          # (n_periods, n_sa2)
+            self._built[metric] = (order.astype(np.int32), np.take_along_axis(v.T, order, axis=1),
+                                   -np.minimum.accumulate(v, axis=1),
+                                   -np.maximum.accumulate(v[:, ::-1], axis=1)[:, ::-1])
+        return self._built[metric]
+
+
+    # ---------- queries ----------
+    def affordable(self, metric, bedrooms, ceiling, t=-1):
+        """``(ids, values)`` of SA2s within ``ceiling`` in month ``t``, cheapest first."""
+        order, sorted_, _, _ = self._index(metric)
+        k = np.searchsorted(sorted_[t], self.limit(metric, bedrooms, ceiling), side="right")
+        return order[t, :k], sorted_[t, :k]*self.coefficient(metric, bedrooms)
+
+    def counts(self, metric, bedrooms, ceiling):
+        """Number of affordable SA2s in every month."""
+        _, sorted_, _, _ = self._index(metric)
+        return _count_below(sorted_, self.limit(metric, bedrooms, ceiling))
+
+    def first_months(self, metric, bedrooms, ceiling, ids=None):
+        """Per SA2 (all, or ``ids``), the first month offset it was affordable (-1 if never)."""
+        neg_min = self._index(metric)[2]
+        limit = self.limit(metric, bedrooms, ceiling)
+        t = _count_below(neg_min, -limit, strict=True, which=ids)    # months still above the limit
+        return np.where(t < neg_min.shape[1], t, -1)
+
+    def since_months(self, metric, bedrooms, ceiling, ids=None):
+        """Per SA2 (all, or ``ids``), the month offset from which it has stayed affordable.
+
+        -1 when it is not affordable in the latest month.
+        """
+        neg_max = self._index(metric)[3]
+        limit = self.limit(metric, bedrooms, ceiling)
+        t = _count_below(neg_max, -limit, strict=True, which=ids)
+        return np.where(t < neg_max.shape[1], t, -1)
+
+    def search(self, metric, bedrooms, ceiling, t=-1):
+        """Ranked SA2s within ``ceiling`` in month ``t`` and their affordability timeline.
+
+        Columns: ``SA2_CODE``, ``value`` (bedroom-adjusted), ``headroom``
+        (share of the ceiling left), ``first_affordable`` and
+        ``affordable_since`` (period labels; the latter for a run lasting
+        to the latest month, None when there is none).
+        """
+        ids, vals = self.affordable(metric, bedrooms, ceiling, t)
+        labels = np.array(self.cube.labels + [None], dtype=object)   # -1 -> None
+        first = self.first_months(metric, bedrooms, ceiling, ids)
+        since = self.since_months(metric, bedrooms, ceiling, ids)
+        return pd.DataFrame({"SA2_CODE": self.codes[ids], "value": vals,
+                             "headroom": 1 - vals/ceiling if ceiling else np.nan,
+                             "first_affordable": labels[first], "affordable_since": labels[since]})
+
+    def timeline(self, metric, bedrooms, ceiling):
+        """Per month: the period label and how many SA2s were affordable."""
+        return pd.DataFrame({"date": self.cube.labels,
+                             "affordable": self.counts(metric, bedrooms, ceiling)})
@@ -0,0 +1,249 @@
+"""SA2 polygon loading: on-disk store plus concurrent source fetching.
+
+Sources (a local file, a local stand-in server, ABS ArcGIS, the GitHub
+mirror) are raced over one pooled HTTP session and the first valid
+FeatureCollection wins. ArcGIS results are fetched as parallel
+``resultOffset`` pages, so nothing is truncated. Every request has its own
+timeout; the race waits as long as some source keeps receiving responses
+(up to ``DEADLINE``), so a slow multi-page fetch is not abandoned. The
+winner is written to a GeometryStore with validity metadata; a fresh store
+entry is served without touching the network, and a stale one is still
+used when every source fails.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+ABS_LAYER = os.environ.get(
+    "SA2_ARCGIS_URL",
+    "https://geo.abs.gov.au/arcgis/rest/services/ASGS2021/SA2/FeatureServer/0/query")
+ABS_PARAMS = {
+    "f": "geojson",
+    "where": "gccsa_name_2021='Greater Sydney'",
+    "outFields": "sa2_code_2021,sa2_name_2021",
+    "outSR": "4326",
+    "geometryPrecision": "5",
+}
+GITHUB_FALLBACK = "https://raw.githubusercontent.com/centreborelli/geo-aus/master/ABS/2016/SA2/sa2_2016_sydney_simplified.geojson"
+
+# a GeoJSON file path or a local stand-in server URL, tried alongside the remote sources
+LOCAL_GEOJSON = os.environ.get("SA2_GEOJSON", "")
+CACHE_DIR = Path(os.environ.get("SA2_GEO_CACHE", Path(__file__).resolve().parent.parent / ".cache" / "geometry"))
+
+STORE_VERSION = 1
+DEFAULT_TTL = 7*24*3600
+PAGE_SIZE = 100
+TIMEOUT = 15          # per request, and how long a race waits without any progress
+DEADLINE = 120       # overall cap on a race
+POLYGON_TYPES = {"Polygon", "MultiPolygon"}
+
+
+def valid_geojson(gj):
+    """True for a non-empty FeatureCollection of polygon features."""
+    if not isinstance(gj, dict) or not gj.get("features"):
+        return False
+    return all(isinstance(f, dict) and (f.get("geometry") or {}).get("type") in POLYGON_TYPES
+               for f in gj["features"])
+
+
+def _collection(features):
+    return {"type": "FeatureCollection", "features": features}
+
+
+# ---------- on-disk store ----------
+class GeometryStore:
+    """GeoJSON files with a JSON metadata sidecar (source, fetch time, checksum)."""
+
+    def __init__(self, root=CACHE_DIR):
+        self.root = Path(root)
+
+    def _paths(self, key):
+        return self.root / f"{key}.geojson", self.root / f"{key}.meta.json"
+
+    def meta(self, key):
+        _, meta_path = self._paths(key)
+        try:
+            return json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def get(self, key, ttl=DEFAULT_TTL):
+        """``(geojson, meta)`` if present, intact and younger than ``ttl`` (None = any age)."""
+        data_path, _ = self._paths(key)
+        meta = self.meta(key)
+        if not meta or meta.get("version") != STORE_VERSION:
+            return None
+        if ttl is not None and time.time() - meta.get("fetched_at", 0) > ttl:
+            return None
+        try:
+            raw = data_path.read_bytes()
+        except OSError:
+            return None
+        if hashlib.sha256(raw).hexdigest() != meta.get("sha256"):
+            return None
+        gj = json.loads(raw)
+        return (gj, meta) if valid_geojson(gj) else None
+
+    def put(self, key, gj, source, **extra):
+        self.root.mkdir(parents=True, exist_ok=True)
+        data_path, meta_path = self._paths(key)
+        raw = json.dumps(gj, separators=(",", ":")).encode()
+        meta = dict(version=STORE_VERSION, source=source, fetched_at=time.time(),
+                    n_features=len(gj["features"]), bytes=len(raw),
+                    sha256=hashlib.sha256(raw).hexdigest(), **extra)
+        # write data first, then metadata, each via rename so readers never see a torn file
+        for path, payload in ((data_path, raw), (meta_path, json.dumps(meta, indent=1).encode())):
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            tmp.write_bytes(payload)
+            os.replace(tmp, path)
+        return meta
+
+
+# ---------- sources ----------
+class Heartbeat:
+    """When any source of a race last received a response."""
+
+    def __init__(self):
+        self.last = time.monotonic()
+
+    def beat(self):
+        self.last = time.monotonic()
+
+
+def make_session(pool_size=16):
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_file(path):
+    with open(path, "rb") as fh:
+        return json.load(fh)
+
+
+def fetch_geojson(session, url, timeout=TIMEOUT, heartbeat=None):
+    r = session.get(url, timeout=timeout)
+    if heartbeat:
+        heartbeat.beat()
+    r.raise_for_status()
+    return r.json()
+
+
+def fetch_arcgis(session, url=ABS_LAYER, params=ABS_PARAMS, page_size=PAGE_SIZE, timeout=TIMEOUT,
+                 heartbeat=None):
+    """Every feature of an ArcGIS query, fetched as parallel offset pages.
+
+    ``heartbeat`` is beaten after every response, so a race keeps waiting
+    while pages are still arriving.
+    """
+    beat = heartbeat.beat if heartbeat else lambda: None
+    r = session.get(url, params={**params, "f": "json", "returnCountOnly": "true"}, timeout=timeout)
+    r.raise_for_status()
+    beat()
+    count = int(r.json()["count"])
+
+    def page(offset):
+        r = session.get(url, params={**params, "resultOffset": offset, "resultRecordCount": page_size,
+                                     "orderByFields": "sa2_code_2021"}, timeout=timeout)
+        r.raise_for_status()
+        beat()
+        return r.json().get("features", [])
+
+    offsets = range(0, count, page_size)
+    with ThreadPoolExecutor(max_workers=min(8, max(1, len(offsets)))) as pool:
+        feats = [f for chunk in pool.map(page, offsets) for f in chunk]
+    feats.sort(key=lambda f: f.get("properties", {}).get("sa2_name_2021", ""))
+    return _collection(feats)
+
+
+def default_sources(session=None, local=LOCAL_GEOJSON, heartbeat=None):
+    """``[(name, thunk)]`` in preference order; thunks return GeoJSON or raise.
+
+    Without ``session`` one pooled session is made by the first network
+    source to run, so requests is only imported when something is fetched.
+    Network sources beat ``heartbeat`` as responses arrive.
+    """
+    lock, pooled = threading.Lock(), [session]
+    def http():
+        with lock:
+            if pooled[0] is None:
+                pooled[0] = make_session()
+            return pooled[0]
+    sources = []
+    if local:
+        if local.startswith(("http://", "https://")):
+            sources.append(("local", lambda: fetch_geojson(http(), local, heartbeat=heartbeat)))
+        else:
+            sources.append(("file", lambda: fetch_file(local)))
+    sources.append(("abs", lambda: fetch_arcgis(http(), heartbeat=heartbeat)))
+    sources.append(("github", lambda: fetch_geojson(http(), GITHUB_FALLBACK, heartbeat=heartbeat)))
+    return sources
+
+
+def race(sources, timeout=TIMEOUT, deadline=DEADLINE, heartbeat=None):
+    """Run all sources concurrently; ``(geojson, name)`` of the first valid result.
+
+    Gives up once no source has beaten ``heartbeat`` for ``timeout`` seconds
+    (without a heartbeat: ``timeout`` after the start), or after ``deadline``.
+    """
+    if not sources:
+        return None, "none"
+    heartbeat = heartbeat or Heartbeat()
+    heartbeat.beat()
+    start = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=len(sources))
+    futures = {pool.submit(fn): name for name, fn in sources}
+    pending = set(futures)
+    try:
+        while pending:
+            now = time.monotonic()
+            left = min(heartbeat.last + timeout, start + deadline) - now
+            if left <= 0:
+                break
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    gj = fut.result()
+                except Exception:
+                    continue
+                if valid_geojson(gj):
+                    return _collection(gj["features"]), futures[fut]
+    finally:
+        # losers keep running until their own timeout, but nobody waits on them
+        pool.shutdown(wait=False, cancel_futures=True)
+    return None, "none"
+
+
+def load_geometry(key="sydney_sa2", store=None, sources=None, ttl=DEFAULT_TTL, timeout=TIMEOUT,
+                  deadline=DEADLINE):
+    """``(geojson, source)``: fresh store entry, else the source race, else a stale entry."""
+    store = store if store is not None else GeometryStore()
+    hit = store.get(key, ttl)
+    if hit:
+        return hit[0], hit[1]["source"]
+    heartbeat = Heartbeat()
+    if sources is None:
+        sources = default_sources(heartbeat=heartbeat)
+    # local files win any race; the network is only tried when none is usable
+    files = [s for s in sources if s[0] == "file"]
+    gj, source = race(files, timeout, deadline) if files else (None, "none")
+    if not gj:
+        gj, source = race([s for s in sources if s[0] != "file"], timeout, deadline, heartbeat)
+    if gj:
+        try:
+            store.put(key, gj, source)
+        except OSError:
+            pass  # read-only deployments still get the fetched geometry
+        return gj, source
+    stale = store.get(key, ttl=None)
+    if stale:
+        return stale[0], stale[1]["source"]
+    return None, "none"
@@ -0,0 +1,85 @@
+"""SA2 -> SA3 -> SA4 -> GCCSA geography hierarchy.
+
+A Hierarchy is one row per SA2 with the code of every enclosing region and
+an optional weight (e.g. dwellings) for weighted aggregates. It comes from
+an ABS allocation file (``SA2_CODE_2021, SA3_CODE_2021, ...``) or, for
+synthetic codes, from the grid layout: SA3s are 2x2 blocks of grid cells,
+SA4s 2x2 blocks of SA3s, all within one Greater Sydney GCCSA.
+"""
+import hashlib
+import re
+
+import numpy as np
+import pandas as pd
+
+from .synthetic import grid_layout
+
+LEVELS = ("SA2", "SA3", "SA4", "GCCSA")
+LEVEL_LABELS = {"SA2": "SA2", "SA3": "SA3", "SA4": "SA4", "GCCSA": "Greater Sydney (GCCSA)"}
+GREATER_SYDNEY = "1GSYD"
+
+
+class Hierarchy:
+    """Region code at every level for each SA2, plus a weight per SA2."""
+
+    def __init__(self, frame):
+        missing = [f"{level}_CODE" for level in LEVELS if f"{level}_CODE" not in frame.columns]
+        if missing:
+            raise ValueError(f"hierarchy is missing {', '.join(missing)}")
+        frame = frame.drop_duplicates("SA2_CODE").reset_index(drop=True)
+        self.frame = pd.DataFrame({f"{level}_CODE": frame[f"{level}_CODE"].astype(str) for level in LEVELS})
+        self.frame["weight"] = frame["weight"].astype(float) if "weight" in frame else 1.0
+        self._index = pd.Index(self.frame["SA2_CODE"])
+
+    # ---------- construction ----------
+    @classmethod
+    def synthetic(cls, codes):
+        grid = grid_layout(codes)
+        def numbered(keys, prefix):
+            ids = pd.factorize(pd.Series(list(keys)))[0]
+            return [f"{prefix}_{i+1:02d}" for i in ids]
+        rows, cols = grid["row"].to_numpy(), grid["col"].to_numpy()
+        return cls(pd.DataFrame({
+            "SA2_CODE": list(codes),
+            "SA3_CODE": numbered(zip(rows // 2, cols // 2), "SA3"),
+            "SA4_CODE": numbered(zip(rows // 4, cols // 4), "SA4"),
+            "GCCSA_CODE": GREATER_SYDNEY,
+        }))
+
+    @classmethod
+    def read(cls, path, weight=None):
+        """ABS allocation CSV/Parquet; ``_2021``-style suffixes are dropped, ``GCC`` means GCCSA.
+
+        ``weight`` names a column to weight SA2s by (default: equal weights).
+        """
+        path = str(path)
+        df = pd.read_parquet(path) if path.endswith((".parquet", ".pq")) else pd.read_csv(path, dtype=str)
+        column = lambda c: re.sub(r"_\d{4}$", "", c.upper()).replace("GCC_", "GCCSA_")
+        df = df.rename(columns=column)
+        if weight:
+            df["weight"] = pd.to_numeric(df[column(weight)], errors="coerce").fillna(0.0)
+        return cls(df)
+
+    # ---------- lookups ----------
+    def regions(self, level):
+        """Region codes at ``level``, in order of first appearance."""
+        return list(pd.unique(self.frame[f"{level}_CODE"]))
+
+    def assign(self, level, codes):
+        """Index into ``regions(level)`` for each SA2 of ``codes`` (-1 where unknown)."""
+        rows = self._index.get_indexer(list(codes))
+        region = pd.Index(self.regions(level)).get_indexer(self.frame[f"{level}_CODE"])
+        return np.where(rows >= 0, region[rows], -1)
+
+    def parents(self, level, codes):
+        """Region code at ``level`` for each SA2 of ``codes`` (None where unknown)."""
+        regions = np.array(self.regions(level) + [None], dtype=object)
+        return list(regions[self.assign(level, codes)])
+
+    def weights(self, codes):
+        rows = self._index.get_indexer(list(codes))
+        return np.where(rows >= 0, self.frame["weight"].to_numpy()[rows], 0.0)
+
+    def digest(self):
+        return hashlib.blake2b(pd.util.hash_pandas_object(self.frame, index=False).to_numpy().tobytes(),
+                               digest_size=8).hexdigest()
@@ -0,0 +1,263 @@
+"""Streaming medians from raw sale, rental-bond and income records.
+
+Record files are read in fixed-size chunks by a generator, and each chunk
+is folded into mergeable quantile sketches keyed by (SA2, month, bedrooms,
+kind). The sketch is DDSketch-style: values fall into logarithmic buckets
+of relative width ``alpha``, so a sketch is a bucket -> count map, two
+sketches merge by adding counts and any quantile is within ``alpha``
+relative error. Each chunk is grouped to bucket counts before it is merged
+into the state, and merges are batched, so the state holds at most
+``max_buckets`` buckets per key: past that the lowest buckets collapse into
+one (2048 buckets at 0.5% cover nearly nine orders of magnitude, so the
+medians are unaffected). Memory is keys x ``max_buckets`` plus one merge
+batch, whatever the number of records.
+
+State (bucket counts plus a manifest of ingested files) is saved to a
+directory, each save writing a new sketch file that the manifest then
+switches to, so a crash never pairs counts with the wrong file list. A
+rerun only reads files it has not seen, e.g. the new month's extract.
+``SketchSource.panel`` emits the dashboard's panel schema.
+
+    python -m core.ingest STATE_DIR sale:sales.csv bond:bonds.parquet --out panel.parquet
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .cube import FIELDS, PanelCube
+from .sources import PanelSource, _as_date
+from .synthetic import range_months
+
+# kind -> (value column in the record files, panel column it feeds)
+KINDS = {
+    "sale": ("price", "MedianPrice"),
+    "bond": ("weekly_rent", "MedianRent_week"),
+    "income": ("annual_income", "MedianIncome_annual"),
+}
+KEYS = ["SA2_CODE", "month", "bedrooms", "kind"]
+ALPHA = 0.005
+CHUNKSIZE = 500_000
+MAX_BUCKETS = 2048
+
+
+def iter_record_chunks(path, columns, chunksize=CHUNKSIZE):
+    """Yield DataFrames of at most ``chunksize`` rows from a CSV or Parquet file."""
+    path = Path(path)
+    if path.suffix.lower() in (".parquet", ".pq"):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        cols = [c for c in columns if c in pf.schema_arrow.names]
+        for batch in pf.iter_batches(batch_size=chunksize, columns=cols):
+            yield batch.to_pandas()
+    else:
+        header = pd.read_csv(path, nrows=0).columns
+        yield from pd.read_csv(path, usecols=[c for c in columns if c in header], chunksize=chunksize)
+
+
+class SketchSource(PanelSource):
+    """Per-key log-bucket sketches, persisted under ``state_dir``."""
+
+    def __init__(self, state_dir=None, alpha=ALPHA, chunksize=CHUNKSIZE, max_buckets=MAX_BUCKETS):
+        self.state_dir = Path(state_dir) if state_dir else None
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.chunksize = chunksize
+        self.max_buckets = max_buckets
+        self.manifest = {}
+        self.generation = 0
+        self._pending, self._pending_rows = [], 0   # grouped chunks not yet merged into the state
+        self._state = pd.DataFrame({"SA2_CODE": pd.Series(dtype=str), "month": pd.Series(dtype=np.int32),
+                                   "bedrooms": pd.Series(dtype=np.int8), "kind": pd.Series(dtype=str),
+                                   "bucket": pd.Series(dtype=np.int32), "count": pd.Series(dtype=np.int64)})
+        if self.state_dir and (self.state_dir / "manifest.json").exists():
+            self.load()
+
+    # ---------- persistence ----------
+    def load(self):
+        meta = json.loads((self.state_dir / "manifest.json").read_text())
+        if meta["alpha"] != self.alpha:
+            raise ValueError(f"state at {self.state_dir} uses alpha={meta['alpha']}, not {self.alpha}")
+        self.manifest = meta["files"]
+        self.generation = meta.get("generation", 0)
+        with np.load(self.state_dir / meta.get("sketch", "sketch.npz")) as z:
+            state = pd.DataFrame({k: z[k] for k in z.files})
+        state["SA2_CODE"] = state["SA2_CODE"].astype(str)
+        state["kind"] = state["kind"].astype(str)
+        self._state, self._pending, self._pending_rows = state, [], 0
+
+    def save(self):
+        """Write the counts to a new ``sketch-<generation>.npz``, then point the manifest at it."""
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        state = self.state
+        arrays = {c: state[c].to_numpy() for c in state.columns}
+        for c in ("SA2_CODE", "kind"):
+            arrays[c] = state[c].to_numpy(dtype=str)
+        manifest = self.state_dir / "manifest.json"
+        old = json.loads(manifest.read_text()).get("sketch", "sketch.npz") if manifest.exists() else None
+        generation = self.generation + 1
+        name = f"sketch-{generation}.npz"
+        tmp = self.state_dir / (name + ".tmp")
+        with open(tmp, "wb") as fh:
+            np.savez(fh, **arrays)
+        os.replace(tmp, self.state_dir / name)
+        tmp = self.state_dir / "manifest.json.tmp"
+        tmp.write_text(json.dumps({"alpha": self.alpha, "generation": generation, "sketch": name,
+                                   "files": self.manifest}, indent=1))
+        os.replace(tmp, manifest)
+        self.generation = generation
+        if old and old != name:
+            (self.state_dir / old).unlink(missing_ok=True)
+
+    # ---------- ingestion ----------
+    @property
+    def state(self):
+        """Bucket counts, one row per (SA2, month, bedrooms, kind, bucket)."""
+        if self._pending:
+            self._merge()
+        return self._state
+
+    def _merge(self):
+        merged = pd.concat([self._state, *self._pending], ignore_index=True)
+        self._state = self._collapse(merged.groupby(KEYS + ["bucket"], as_index=False, sort=False)["count"].sum())
+        self._pending, self._pending_rows = [], 0
+
+    def _collapse(self, state):
+        """Fold each key's lowest buckets into one so no key has more than ``max_buckets``."""
+        if state.empty or state.groupby(KEYS, sort=False).size().max() <= self.max_buckets:
+            return state
+        state = state.sort_values(KEYS + ["bucket"], ascending=[True]*len(KEYS) + [False], ignore_index=True)
+        rank = state.groupby(KEYS, sort=False).cumcount()
+        floor = state.loc[rank == self.max_buckets - 1, KEYS + ["bucket"]].rename(columns={"bucket": "floor"})
+        state = state.merge(floor, on=KEYS, how="left")
+        low = state["floor"].notna() & (state["bucket"] < state["floor"])
+        state.loc[low, "bucket"] = state.loc[low, "floor"].astype(np.int32)
+        return state.drop(columns="floor").groupby(KEYS + ["bucket"], as_index=False, sort=False)["count"].sum()
+
+    def _bucket(self, values):
+        return np.ceil(np.log(values) / np.log(self.gamma)).astype(np.int32)
+
+    def add_chunk(self, chunk, kind):
+        """Fold one DataFrame of records (date, SA2_CODE, [bedrooms], value) into the state."""
+        value_col = KINDS[kind][0]
+        values = pd.to_numeric(chunk[value_col], errors="coerce").to_numpy(dtype=float)
+        dates = pd.to_datetime(chunk["date"], errors="coerce")
+        ok = np.isfinite(values) & (values > 0) & dates.notna().to_numpy()
+        if not ok.any():
+            return 0
+        beds = (pd.to_numeric(chunk["bedrooms"], errors="coerce").fillna(-1).to_numpy()
+                if "bedrooms" in chunk else np.full(len(chunk), -1))
+        part = pd.DataFrame({
+            "SA2_CODE": chunk["SA2_CODE"].astype(str).to_numpy()[ok],
+            "month": (dates.dt.year*12 + dates.dt.month - 1).to_numpy()[ok].astype(np.int32),
+            "bedrooms": beds[ok].astype(np.int8),
+            "kind": kind,
+            "bucket": self._bucket(values[ok]),
+            "count": np.ones(int(ok.sum()), dtype=np.int64),
+        })
+        part = part.groupby(KEYS + ["bucket"], as_index=False, sort=False)["count"].sum()
+        self._pending.append(part)
+        self._pending_rows += len(part)
+        # merging once the batch outgrows the state keeps the total merge work linear
+        if self._pending_rows >= max(len(self._state), self.chunksize):
+            self._merge()
+        return int(ok.sum())
+
+    def ingest_chunks(self, chunks, kind):
+        """Fold an iterable of record DataFrames; returns the number of records used."""
+        return sum(self.add_chunk(c, kind) for c in chunks)
+
+    def ingest(self, path, kind, save=True):
+        """Ingest a record file once; files already in the manifest are skipped.
+
+        Record files are treated as immutable: a known file whose size or
+        mtime changed raises, since its old counts cannot be told apart.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {sorted(KINDS)}, got {kind!r}")
+        path = Path(path).resolve()
+        st = path.stat()
+        key, sig = str(path), {"size": st.st_size, "mtime": st.st_mtime, "kind": kind}
+        seen = self.manifest.get(key)
+        if seen:
+            if any(seen[k] != sig[k] for k in sig):
+                raise ValueError(f"{path} changed since it was ingested; rebuild the state")
+            return 0
+        n = self.ingest_chunks(iter_record_chunks(path, ["date", "SA2_CODE", "bedrooms", KINDS[kind][0]],
+                                                  self.chunksize), kind)
+        self.manifest[key] = {**sig, "records": n}
+        if save and self.state_dir:
+            self.save()
+        return n
+
+    # ---------- output ----------
+    def quantiles(self, q=0.5, bedrooms=None):
+        """Quantile per (SA2, month, kind); ``bedrooms`` None merges all bedroom sketches.
+
+        Income has no bedroom split, so its sketches are kept whatever ``bedrooms`` is.
+        """
+        s = self.state
+        if bedrooms is not None:
+            s = s[(s["bedrooms"] == bedrooms) | (s["kind"] == "income")]
+        keys = ["SA2_CODE", "month", "kind"]
+        s = s.groupby(keys + ["bucket"], as_index=False)["count"].sum()  # merge, sorted by bucket
+        g = s.groupby(keys, sort=False)["count"]
+        cum, total = g.cumsum(), g.transform("sum")
+        first = s[cum > q*(total - 1)].groupby(keys, as_index=False).head(1)
+        est = 2 * self.gamma**first["bucket"].to_numpy(dtype=float) / (self.gamma + 1)
+        return first[keys].assign(value=est)
+
+    def panel(self, bedrooms=None, q=0.5):
+        """Long panel in the dashboard schema (date, SA2_CODE, MedianPrice, ...)."""
+        qs = self.quantiles(q, bedrooms)
+        wide = (qs.assign(field=qs["kind"].map({k: v[1] for k, v in KINDS.items()}))
+                  .pivot_table(index=["month", "SA2_CODE"], columns="field", values="value")
+                  .reindex(columns=list(FIELDS)).rename_axis(columns=None).reset_index())
+        dates = [f"{m//12:04d}-{m%12+1:02d}" for m in wide["month"]]
+        return (wide.assign(date=dates)[["date", "SA2_CODE", *FIELDS]]
+                    .sort_values(["SA2_CODE", "date"]).reset_index(drop=True))
+
+    def arrays(self, fields=FIELDS, sa2=None, start=None, end=None, bedrooms=None):
+        df = self.panel(bedrooms)
+        start, end = _as_date(start), _as_date(end)
+        if sa2 is not None:
+            df = df[df["SA2_CODE"].isin(list(sa2))]
+        if start is not None:
+            df = df[df["date"] >= start.strftime("%Y-%m")]
+        if end is not None:
+            df = df[df["date"] <= end.strftime("%Y-%m")]
+        if df.empty:
+            return [], [], {f: np.empty((0, 0)) for f in fields}
+        periods = range_months(_as_date(df["date"].min()), _as_date(df["date"].max()))
+        cube = PanelCube.from_long(df, periods, tuple(fields))
+        return cube.codes, periods, {f: cube.series(f) for f in fields}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fold record files into SA2 median sketches.")
+    ap.add_argument("state_dir")
+    ap.add_argument("files", nargs="*", help="KIND:PATH with KIND in " + ", ".join(KINDS))
+    ap.add_argument("--alpha", type=float, default=ALPHA)
+    ap.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    ap.add_argument("--max-buckets", type=int, default=MAX_BUCKETS)
+    ap.add_argument("--bedrooms", type=int, default=None)
+    ap.add_argument("--out", help="write the panel (.csv or .parquet)")
+    args = ap.parse_args(argv)
+
+    src = SketchSource(args.state_dir, alpha=args.alpha, chunksize=args.chunksize,
+                       max_buckets=args.max_buckets)
+    for spec in args.files:
+        kind, _, path = spec.partition(":")
+        n = src.ingest(path, kind)
+        print(f"{kind:6s} {path}: {n:,} new records" if n else f"{kind:6s} {path}: already ingested")
+    if args.out:
+        df = src.panel(args.bedrooms)
+        df.to_parquet(args.out, index=False) if args.out.endswith((".parquet", ".pq")) else df.to_csv(args.out, index=False)
+        print(f"panel: {len(df):,} rows -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Map-layer metrics computed as whole-column array expressions.
+
+Every layer (RTI, PTI, rent, price, income, payment cap gap) is evaluated in
+one pass for a bedrooms/deposit/rate/cap setting, so the maps, the comparison
+table and the colour range all read the same aligned arrays.
+"""
+import numpy as np
+import pandas as pd
+
+from .finance import principal_from_monthly
+
+RENT_BEDROOM_COEFFS = {1:1.00, 2:1.35, 3:1.75}
+PRICE_BEDROOM_COEFFS = {1:0.85, 2:1.00, 3:1.25}
+
+LAYERS = ["RTI", "PTI", "Median Rent", "Median Price", "Median Income", "Payment Cap Gap"]
+HIGHER_IS_BAD = {"Median Price", "Median Rent", "PTI", "RTI", "Payment Cap Gap"}
+CAP_GAP_YEARS = 25  # cap-gap baseline uses a fixed 25y term
+
+# layer name -> column of the snapshot frame
+LAYER_COLUMNS = {
+    "RTI": "RTI",
+    "PTI": "PTI",
+    "Median Rent": "MedianRent_week_adj",
+    "Median Price": "MedianPrice_adj",
+    "Median Income": "MedianIncome_annual",
+    "Payment Cap Gap": "gap",
+}
+
+
+def adjusted_columns(price, rent_week, income, bedrooms):
+    """Bedroom-adjusted price/rent plus PTI and RTI for arrays of any shape."""
+    brR = RENT_BEDROOM_COEFFS.get(bedrooms, 1.0)
+    brP = PRICE_BEDROOM_COEFFS.get(bedrooms, 1.0)
+    rent_adj = rent_week*brR
+    price_adj = price*brP
+    return {
+        "MedianPrice_adj": price_adj,
+        "MedianRent_week_adj": rent_adj,
+        "MedianIncome_annual": income,
+        "PTI": price_adj/income,
+        "RTI": (rent_adj*52)/income,
+    }
+
+
+def cap_gap(price_adj, deposit_pct, interest, max_monthly):
+    """Share of the price the loan needed exceeds the payment-cap loan by.
+
+    ``interest`` is in %/yr and ``deposit_pct`` in %, as entered in the sidebar.
+    """
+    loan_cap = principal_from_monthly(max_monthly, interest/100.0, CAP_GAP_YEARS)
+    L_needed = price_adj*(1-deposit_pct/100.0)
+    return (L_needed - loan_cap)/price_adj
+
+
+def compute_layers(price, rent_week, income, bedrooms, deposit_pct, interest, max_monthly):
+    """All layer columns for arrays of any (matching) shape."""
+    cols = adjusted_columns(price, rent_week, income, bedrooms)
+    cols["gap"] = cap_gap(cols["MedianPrice_adj"], deposit_pct, interest, max_monthly)
+    return cols
+
+
+class MetricLayers:
+    """Layer arrays for one snapshot, aligned with ``codes``."""
+
+    def __init__(self, codes, raw, columns):
+        self.codes = list(codes)
+        self.raw = raw
+        self.columns = columns
+
+    def with_columns(self, **columns):
+        return MetricLayers(self.codes, self.raw, {**self.columns, **columns})
+
+    def values(self, metric):
+        """Array for a map layer; unknown names fall back to RTI."""
+        return self.columns[LAYER_COLUMNS.get(metric, "RTI")]
+
+    def color_range(self, metric):
+        v = self.values(metric)
+        return float(np.nanmin(v)), float(np.nanmax(v))
+
+    def frame(self):
+        """Snapshot table: SA2_CODE, raw fields, then every layer column."""
+        return pd.DataFrame({"SA2_CODE": self.codes, **self.raw, **self.columns})
+
+
+def snapshot_layers(cube, bedrooms, deposit_pct=None, interest=None, max_monthly=None, t=-1):
+    """Layers at period ``t``; the cap gap is left out unless finance inputs are given."""
+    snap = cube.snapshot(t)
+    raw = {f: snap[:, i] for i, f in enumerate(cube.fields)}
+    columns = adjusted_columns(raw["MedianPrice"], raw["MedianRent_week"],
+                               raw["MedianIncome_annual"], bedrooms)
+    if deposit_pct is not None:
+        columns["gap"] = cap_gap(columns["MedianPrice_adj"], deposit_pct, interest, max_monthly)
+    return MetricLayers(cube.codes, raw, columns)
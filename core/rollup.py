@@ -0,0 +1,264 @@
+"""Pre-aggregated panel at SA3, SA4 and GCCSA level.
+
+For every region and period a Rollups holds the median and the weighted
+mean over its SA2s of price, weekly rent, income, PTI and RTI, plus how
+many SA2s reported. PTI and RTI are aggregated per SA2 ratio, not as a
+ratio of aggregates. Values are stored without the bedroom coefficients:
+both statistics commute with the positive scaling, so ``values`` applies
+the coefficient on read and one rollup serves every bedroom setting.
+
+Rollups are saved next to the panel (``<panel dir>/_rollups``, which
+Arrow dataset scans skip; ``ROLLUP_DIR`` overrides) with a digest per
+period of the base values. ``update`` recomputes only periods that are new
+or whose SA2 values changed, so a monthly refresh aggregates one month.
+The arrays go to a file named after a digest of the manifest, which also
+records it, so a manifest is never read against another save's arrays.
+"""
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+from .hierarchy import LEVELS
+from .metrics import PRICE_BEDROOM_COEFFS, RENT_BEDROOM_COEFFS, MetricLayers, cap_gap
+
+ROLLUP_DIR = os.environ.get("ROLLUP_DIR", "")
+CACHE_DIR = Path(__file__).resolve().parent.parent / ".cache" / "rollups"
+ROLLUP_LEVELS = LEVELS[1:]
+ROLLUP_FIELDS = ("MedianPrice", "MedianRent_week", "MedianIncome_annual", "PTI", "RTI")
+STATS = ("median", "wmean")
+STAT_LABELS = {"median": "Median", "wmean": "Weighted mean"}
+
+# trend series (core.trends.SERIES) -> (field, bedroom-adjusted?, factor), as TrendStore derives them
+TREND_SERIES = {
+    "Rent": ("MedianRent_week", True, 1.0),
+    "RentMonthly": ("MedianRent_week", True, 52/12),
+    "Price": ("MedianPrice", False, 1.0),
+    "PTI": ("PTI", False, 1.0),
+    "RTI": ("RTI", True, 1.0),
+}
+
+
+def rollup_path(spec):
+    """Directory for the rollups of panel source ``spec``: beside a local panel, else under ``.cache``."""
+    if ROLLUP_DIR:
+        return Path(ROLLUP_DIR)
+    path = Path(str(spec))
+    if not str(spec).startswith("synthetic") and path.exists():
+        return path / "_rollups" if path.is_dir() else path.with_name(path.name + ".rollups")
+    return CACHE_DIR / re.sub(r"[^\w.-]", "_", str(spec))
+
+
+def bedroom_coefficient(field, bedrooms):
+    if field in ("MedianPrice", "PTI"):
+        return PRICE_BEDROOM_COEFFS.get(bedrooms, 1.0)
+    if field in ("MedianRent_week", "RTI"):
+        return RENT_BEDROOM_COEFFS.get(bedrooms, 1.0)
+    return 1.0
+
+
+def sa2_fields(values, fields):
+    """``(n_sa2, n_periods, len(ROLLUP_FIELDS))`` from cube values with ``fields`` on the last axis."""
+    price, rent, income = (values[..., fields.index(f)] for f in ROLLUP_FIELDS[:3])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.stack([price, rent, income, price/income, rent*52/income], axis=-1)
+
+
+def columns(x):
+    """``(n_sa2, ...)`` as contiguous ``(n_columns, n_sa2)``: one row per period and field."""
+    return np.ascontiguousarray(x.reshape(x.shape[0], -1).T)
+
+
+def value_order(x):
+    """Per column of ``x``, its SA2 rows by ascending value (NaN last); shared by every level."""
+    return np.argsort(columns(x), axis=1)
+
+
+def aggregate(x, groups, n_groups, weights, by_value=None):
+    """Median and weighted mean of ``x`` rows per group, ignoring NaN.
+
+    ``x`` is ``(n_sa2, n_periods, n_fields)``; returns
+    ``(n_groups, n_periods, n_fields, len(STATS))`` and the SA2 count
+    ``(n_groups, n_periods)`` (SA2s with a price). ``by_value`` is
+    ``value_order(x)``, when already computed for another level.
+    """
+    shape = x.shape[1:]
+    out = np.full((n_groups, *shape, len(STATS)), np.nan)
+    count = np.zeros((n_groups, shape[0]), dtype=np.int32)
+    g = np.where(groups >= 0, groups, n_groups).astype(np.int16 if n_groups < 2**15 else np.int32)
+    sizes = np.bincount(g, minlength=n_groups + 1)[:n_groups]
+    present = np.flatnonzero(sizes)
+    if not len(present):
+        return out, count
+    m = int(sizes.sum())                                  # SA2s in a known region, sorted first
+    bounds = (np.cumsum(sizes) - sizes)[present]          # where each region's rows start
+    cols = columns(x)
+    rows = np.argsort(g, kind="stable")[:m]
+    c, w = cols[:, rows], np.asarray(weights, dtype=float)[rows]
+    ok = ~np.isnan(c)
+    n_ok = np.add.reduceat(ok, bounds, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        wmean = (np.add.reduceat(np.where(ok, c*w, 0.0), bounds, axis=1)
+                 / np.add.reduceat(ok*w, bounds, axis=1))
+    # order every column by value, then stably by region (a radix sort on the small ints): each
+    # region's rows keep their place with values ascending, and its median is the middle of the
+    # leading non-NaN run
+    if by_value is None:
+        by_value = value_order(x)
+    ranked = np.take_along_axis(by_value, np.argsort(g[by_value], axis=1, kind="stable")[:, :m], axis=1)
+    ranked = np.take_along_axis(cols, ranked, axis=1)
+    lo = bounds + np.maximum(n_ok - 1, 0)//2
+    hi = bounds + np.maximum(n_ok, 1)//2
+    with np.errstate(invalid="ignore"):
+        median = np.where(n_ok > 0, (np.take_along_axis(ranked, lo, axis=1)
+                                     + np.take_along_axis(ranked, hi, axis=1))/2, np.nan)
+    out[present, ..., 0] = median.T.reshape(len(present), *shape)
+    out[present, ..., 1] = wmean.T.reshape(len(present), *shape)
+    count[present] = n_ok.T.reshape(len(present), *shape)[..., 0]
+    return out, count
+
+
+def period_digests(cube):
+    return [hashlib.blake2b(np.ascontiguousarray(cube.values[:, t, :]).tobytes(), digest_size=8).hexdigest()
+            for t in range(len(cube.periods))]
+
+
+def codes_digest(codes):
+    return hashlib.blake2b("\n".join(codes).encode(), digest_size=8).hexdigest()
+
+
+class Rollups:
+    """``(n_regions, n_periods, field, stat)`` arrays per level, aligned with the cube's periods."""
+
+    def __init__(self, hierarchy, codes, labels, digests, data, counts):
+        self.hierarchy = hierarchy
+        self.codes_digest = codes_digest(codes)
+        self.labels = list(labels)
+        self.digests = list(digests)
+        self.data = data        # level -> (n_regions, n_periods, n_fields, n_stats)
+        self.counts = counts    # level -> (n_regions, n_periods)
+
+    @classmethod
+    def build(cls, cube, hierarchy):
+        r = cls(hierarchy, cube.codes, [], [], {}, {})
+        r.update(cube)
+        return r
+
+    def _compute(self, cube, periods):
+        x = sa2_fields(cube.values[:, periods, :], cube.fields)
+        w, by_value = self.hierarchy.weights(cube.codes), value_order(x)
+        return {level: aggregate(x, self.hierarchy.assign(level, cube.codes),
+                                 len(self.hierarchy.regions(level)), w, by_value)
+                for level in ROLLUP_LEVELS}
+
+    def update(self, cube):
+        """Bring the rollups in line with ``cube``; returns how many periods were aggregated."""
+        digests = period_digests(cube)
+        same_codes = codes_digest(cube.codes) == self.codes_digest and self.data
+        old = {label: t for t, label in enumerate(self.labels)} if same_codes else {}
+        reuse = [(t, old[label]) for t, label in enumerate(cube.labels)
+                 if label in old and self.digests[old[label]] == digests[t]]
+        if len(reuse) == len(cube.labels) == len(self.labels):
+            return 0
+        reused = {t for t, _ in reuse}
+        stale = [t for t in range(len(cube.labels)) if t not in reused]
+        fresh = self._compute(cube, stale) if stale else {}
+        data, counts = {}, {}
+        for level in ROLLUP_LEVELS:
+            n = len(self.hierarchy.regions(level))
+            data[level] = np.full((n, len(cube.labels), len(ROLLUP_FIELDS), len(STATS)), np.nan)
+            counts[level] = np.zeros((n, len(cube.labels)), dtype=np.int32)
+            if reuse:
+                new_t, old_t = map(list, zip(*reuse))
+                data[level][:, new_t] = self.data[level][:, old_t]
+                counts[level][:, new_t] = self.counts[level][:, old_t]
+            if stale:
+                data[level][:, stale], counts[level][:, stale] = fresh[level]
+        self.data, self.counts = data, counts
+        self.labels, self.digests = list(cube.labels), digests
+        self.codes_digest = codes_digest(cube.codes)
+        return len(stale)
+
+    # ---------- persistence ----------
+    def save(self, path):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        meta = {"hierarchy": self.hierarchy.digest(), "codes": self.codes_digest,
+                "labels": self.labels, "digests": self.digests}
+        stamp = hashlib.blake2b(json.dumps(meta).encode(), digest_size=16).hexdigest()
+        name = f"rollups-{stamp}.npz"
+        arrays = {f"{level}_values": self.data[level] for level in ROLLUP_LEVELS}
+        arrays.update({f"{level}_count": self.counts[level] for level in ROLLUP_LEVELS})
+        with open(path / (name + ".tmp"), "wb") as fh:
+            np.savez(fh, stamp=stamp, **arrays)
+        os.replace(path / (name + ".tmp"), path / name)
+        manifest = path / "manifest.json"
+        old = json.loads(manifest.read_text()).get("arrays", "rollups.npz") if manifest.exists() else None
+        tmp = path / "manifest.json.tmp"
+        tmp.write_text(json.dumps({**meta, "stamp": stamp, "arrays": name}))
+        os.replace(tmp, manifest)
+        if old and old != name:
+            (path / old).unlink(missing_ok=True)
+
+    @classmethod
+    def load(cls, path, hierarchy):
+        """Saved rollups for ``hierarchy``, or None when there are none (or for another hierarchy)."""
+        path = Path(path)
+        if not (path / "manifest.json").exists():
+            return None
+        meta = json.loads((path / "manifest.json").read_text())
+        if meta["hierarchy"] != hierarchy.digest() or "arrays" not in meta or not (path / meta["arrays"]).exists():
+            return None
+        with np.load(path / meta["arrays"]) as z:
+            if "stamp" not in z.files or str(z["stamp"]) != meta["stamp"]:
+                return None
+            data = {level: z[f"{level}_values"] for level in ROLLUP_LEVELS}
+            counts = {level: z[f"{level}_count"] for level in ROLLUP_LEVELS}
+        r = cls(hierarchy, [], meta["labels"], meta["digests"], data, counts)
+        r.codes_digest = meta["codes"]
+        return r
+
+    @classmethod
+    def open(cls, path, cube, hierarchy):
+        """Load from ``path``, update for ``cube`` and save back if anything was recomputed."""
+        r = cls.load(path, hierarchy) if path else None
+        if r is None:
+            r = cls(hierarchy, cube.codes, [], [], {}, {})
+        if r.update(cube) and path:
+            try:
+                r.save(path)
+            except OSError:
+                pass   # read-only deployments keep the in-memory rollups
+        return r
+
+    # ---------- reads ----------
+    def regions(self, level):
+        return self.hierarchy.regions(level)
+
+    def values(self, level, field, stat="median", bedrooms=None, start=0):
+        """``(n_regions, n_periods - start)`` of one field and statistic, bedroom-adjusted."""
+        v = self.data[level][:, start:, ROLLUP_FIELDS.index(field), STATS.index(stat)]
+        c = bedroom_coefficient(field, bedrooms)
+        return v*c if c != 1.0 else v
+
+    def series(self, series_key, level, stat="median", bedrooms=None, start=0):
+        """A trend series (``TREND_SERIES``) for every region at ``level``."""
+        field, adjusted, factor = TREND_SERIES[series_key]
+        v = self.values(level, field, stat, bedrooms if adjusted else None, start)
+        return v*factor if factor != 1.0 else v
+
+    def layers(self, level, bedrooms, stat="median", deposit_pct=None, interest=None, max_monthly=None,
+               t=-1):
+        """Map-layer columns per region at period ``t``, like ``snapshot_layers`` for SA2s."""
+        at = lambda field, b=None: self.values(level, field, stat, b)[:, t]
+        raw = {f: at(f) for f in ROLLUP_FIELDS[:3]}
+        columns = {"MedianPrice_adj": at("MedianPrice", bedrooms),
+                   "MedianRent_week_adj": at("MedianRent_week", bedrooms),
+                   "MedianIncome_annual": at("MedianIncome_annual"),
+                   "PTI": at("PTI", bedrooms), "RTI": at("RTI", bedrooms)}
+        if deposit_pct is not None:
+            columns["gap"] = cap_gap(columns["MedianPrice_adj"], deposit_pct, interest, max_monthly)
+        return MetricLayers(self.regions(level), raw, columns)
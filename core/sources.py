@@ -0,0 +1,195 @@
+"""Pluggable panel data sources.
+
+A source yields the panel as ``(codes, periods, fields)`` — the same triple
+``simulate`` returns — restricted to the requested fields, SA2s and period
+range, and builds a PanelCube from it. ``SyntheticSource`` wraps the
+synthetic generator; ``ArrowSource`` reads partitioned Parquet or Arrow IPC
+datasets with projection and predicate pushdown. The selected rows are
+scattered into dense arrays, so nothing stays backed by the files: sharing
+is per process, through the cube the app holds as a cached resource.
+
+pyarrow is only needed for ``ArrowSource``/``write_panel`` and is imported
+when they are used.
+"""
+import abc
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from .cube import FIELDS, PanelCube
+from .synthetic import range_months, simulate
+
+FORMATS = {".parquet": "parquet", ".pq": "parquet", ".arrow": "ipc", ".feather": "ipc", ".ipc": "ipc"}
+
+
+def _as_date(d):
+    """``date``, ``"YYYY-MM"`` or ``"YYYY-MM-DD"`` -> ``date`` (None passes through)."""
+    if d is None or isinstance(d, date):
+        return d
+    parts = [int(p) for p in str(d).split("-")]
+    return date(parts[0], parts[1], parts[2] if len(parts) > 2 else 1)
+
+
+class PanelSource(abc.ABC):
+    """Interface: ``arrays`` does the work, ``cube`` and ``read`` wrap it."""
+
+    freq = "M"
+
+    @abc.abstractmethod
+    def arrays(self, fields=FIELDS, sa2=None, start=None, end=None):
+        """``(codes, periods, {field: (n_sa2, n_periods) array})`` for the selection.
+
+        ``sa2`` is an iterable of codes (None = all); ``start``/``end`` are
+        inclusive period bounds as dates or ``YYYY-MM[-DD]`` strings.
+        """
+
+    def cube(self, fields=FIELDS, sa2=None, start=None, end=None, dtype=np.float64):
+        codes, periods, arrays = self.arrays(fields, sa2, start, end)
+        return PanelCube.from_arrays(codes, periods, arrays, self.freq, dtype)
+
+    def read(self, fields=FIELDS, sa2=None, start=None, end=None):
+        """Long ``date/SA2_CODE`` frame, the layout the dashboard started from."""
+        return self.cube(fields, sa2, start, end).to_long()
+
+
+class SyntheticSource(PanelSource):
+    """The synthetic generator behind the PanelSource interface."""
+
+    def __init__(self, n_sa2=12, freq="M", **kwargs):
+        self.n_sa2, self.freq, self.kwargs = n_sa2, freq, kwargs
+
+    def arrays(self, fields=FIELDS, sa2=None, start=None, end=None):
+        codes, periods, arrays = simulate(self.n_sa2, freq=self.freq, **self.kwargs)
+        start, end = _as_date(start), _as_date(end)
+        t = np.array([(start is None or p >= start) and (end is None or p <= end) for p in periods], dtype=bool)
+        rows = np.arange(len(codes))
+        if sa2 is not None:
+            wanted = set(sa2)
+            rows = np.array([i for i, c in enumerate(codes) if c in wanted], dtype=int)
+        return ([codes[i] for i in rows], [p for p, keep in zip(periods, t) if keep],
+                {f: arrays[f][np.ix_(rows, t)] for f in fields})
+
+
+class ArrowSource(PanelSource):
+    """Partitioned Parquet / Arrow IPC panel in long layout.
+
+    Expected columns: ``date`` (``YYYY-MM`` strings or a date/timestamp type),
+    ``SA2_CODE`` and the value fields; hive-style partition directories
+    (e.g. ``year=2020/``) are pruned when a ``year`` partition exists.
+    """
+
+    def __init__(self, path, format=None, partitioning="hive", freq="M"):
+        self.path = str(path)
+        self.format = format or self._infer_format(Path(path))
+        self.partitioning = partitioning
+        self.freq = freq
+        self._dataset = None
+
+    @staticmethod
+    def _infer_format(path):
+        if path.is_file():
+            return FORMATS.get(path.suffix.lower(), "parquet")
+        for p in path.rglob("*"):
+            if p.suffix.lower() in FORMATS:
+                return FORMATS[p.suffix.lower()]
+        return "parquet"
+
+    @property
+    def dataset(self):
+        if self._dataset is None:
+            import pyarrow.dataset as ds
+            self._dataset = ds.dataset(self.path, format=self.format, partitioning=self.partitioning)
+        return self._dataset
+
+    def _filter(self, sa2, start, end):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        schema = self.dataset.schema
+        expr = None
+        def both(e):
+            return e if expr is None else expr & e
+        if sa2 is not None:
+            expr = both(ds.field("SA2_CODE").isin(pa.array(list(sa2), type=pa.string())))
+        string_dates = pa.types.is_string(schema.field("date").type) or pa.types.is_large_string(schema.field("date").type)
+        fmt = "%Y-%m" if self.freq == "M" else "%Y-%m-%d"
+        for bound, op in ((start, "ge"), (end, "le")):
+            if bound is None:
+                continue
+            value = bound.strftime(fmt) if string_dates else pa.scalar(bound, type=pa.date32())
+            field = ds.field("date")
+            expr = both(field >= value if op == "ge" else field <= value)
+            if "year" in schema.names:
+                year = ds.field("year")
+                expr = both(year >= bound.year if op == "ge" else year <= bound.year)
+        return expr
+
+    def _offsets(self, column):
+        """Months since year 0 (monthly) or days since 1970-01-01 (weekly) for every row."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            if self.freq == "M":
+                year = pc.cast(pc.utf8_slice_codeunits(column, 0, 4), pa.int64()).to_numpy()
+                month = pc.cast(pc.utf8_slice_codeunits(column, 5, 7), pa.int64()).to_numpy()
+                return year*12 + month - 1
+            column = pc.strptime(column, format="%Y-%m-%d", unit="s")
+        if self.freq == "M":
+            return (pc.year(column).to_numpy().astype(np.int64)*12
+                    + pc.month(column).to_numpy().astype(np.int64) - 1)
+        return pc.cast(pc.cast(column, pa.timestamp("s")), pa.int64()).to_numpy().astype(np.int64) // 86400
+
+    def arrays(self, fields=FIELDS, sa2=None, start=None, end=None):
+        import pyarrow.compute as pc
+        start, end = _as_date(start), _as_date(end)
+        table = self.dataset.to_table(columns=["date", "SA2_CODE", *fields],
+                                      filter=self._filter(sa2, start, end))
+        if table.num_rows == 0:
+            return [], [], {f: np.empty((0, 0)) for f in fields}
+
+        # categorical SA2 dimension, in sorted code order
+        enc = pc.dictionary_encode(table["SA2_CODE"]).combine_chunks()
+        names = np.array(enc.dictionary.to_pylist(), dtype=object)
+        order = np.argsort(names)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        rows = rank[enc.indices.to_numpy()]
+        codes = list(names[order])
+
+        t = self._offsets(table["date"].combine_chunks())
+        t0, t1 = int(t.min()), int(t.max())
+        if self.freq == "M":
+            periods = range_months(date(t0//12, t0 % 12 + 1, 1), date(t1//12, t1 % 12 + 1, 1))
+            cols = t - t0
+        else:
+            first = date(1970, 1, 1) + timedelta(days=t0)
+            periods = [first + timedelta(weeks=k) for k in range((t1 - t0)//7 + 1)]
+            cols = (t - t0)//7
+
+        arrays = {}
+        for f in fields:
+            out = np.full((len(codes), len(periods)), np.nan)
+            out[rows, cols] = table[f].to_numpy()
+            arrays[f] = out
+        return codes, periods, arrays
+
+
+def open_source(spec, **kwargs):
+    """``"synthetic"`` (optionally ``"synthetic:<n_sa2>"``) or a Parquet/Arrow path."""
+    if not spec or str(spec).startswith("synthetic"):
+        n = str(spec).partition(":")[2]
+        return SyntheticSource(int(n) if n else 12, **kwargs)
+    return ArrowSource(spec, **kwargs)
+
+
+def write_panel(source, path, format="parquet", partition_by=("year",), **select):
+    """Write ``source`` as a hive-partitioned long-layout dataset (for exports and tests)."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    df = source.read(**select)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if "year" in partition_by:
+        table = table.append_column("year", pa.array(df["date"].str.slice(0, 4).astype(int), pa.int16()))
+    ds.write_dataset(table, path, format=format, partitioning=list(partition_by),
+                     partitioning_flavor="hive", existing_data_behavior="overwrite_or_ignore")
+    return path
@@ -0,0 +1,198 @@
+"""Timing spans for one dashboard rerun, and their export.
+
+A Tracer records nested ``(name, duration, attributes)`` spans. The active
+tracer lives in a context variable, so cached stage bodies can ``annotate``
+the span they run under (e.g. ``cache="miss"``) without it being passed
+around. When tracing is off the active tracer is ``NULL``, whose spans are
+one shared no-op context manager.
+
+SpanExporter writes finished runs either as JSON lines (one object per run,
+appended) or as a Prometheus text file of per-stage latency histograms and
+cache counters, rewritten atomically (node-exporter textfile style).
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+
+
+class _NullSpan(dict):
+    """Absorbs attribute writes; one instance serves every disabled span."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setitem__(self, key, value):
+        pass
+
+    def update(self, *args, **kwargs):
+        pass
+
+
+class _NullTracer:
+    enabled = False
+    spans = ()
+    _null = _NullSpan()
+
+    def span(self, name, **attrs):
+        return self._null
+
+    def annotate(self, **attrs):
+        pass
+
+
+NULL = _NullTracer()
+_active = contextvars.ContextVar("dashboard_tracer", default=NULL)
+
+
+class Tracer:
+    """Spans of one run, in start order; ``depth`` gives the nesting."""
+
+    enabled = True
+
+    def __init__(self, **meta):
+        self.meta = meta
+        self.spans = []
+        self._open = []
+        self._t0 = time.perf_counter()
+        self.started_at = time.time()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        record = {"name": name, "depth": len(self._open),
+                  "at_ms": (time.perf_counter() - self._t0)*1e3, **attrs}
+        self.spans.append(record)
+        self._open.append(record)
+        t = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["ms"] = (time.perf_counter() - t)*1e3
+            self._open.pop()
+
+    def annotate(self, **attrs):
+        """Set attributes on the innermost open span."""
+        if self._open:
+            self._open[-1].update(attrs)
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self._t0)*1e3
+
+    def to_dict(self):
+        return {"ts": self.started_at, **self.meta, "total_ms": round(self.total_ms, 3),
+                "spans": [{**s, "ms": round(s.get("ms", 0.0), 3), "at_ms": round(s["at_ms"], 3)}
+                          for s in self.spans]}
+
+
+def annotate(**attrs):
+    _active.get().annotate(**attrs)
+
+
+def span(name, **attrs):
+    return _active.get().span(name, **attrs)
+
+
+def begin(enabled=True, **meta):
+    """Make a new tracer (or ``NULL``) the active one for this context."""
+    tracer = Tracer(**meta) if enabled else NULL
+    _active.set(tracer)
+    return tracer
+
+
+def end(tracer, exporter=None):
+    """Deactivate ``tracer`` and hand it to ``exporter`` if there is one."""
+    if _active.get() is tracer:
+        _active.set(NULL)
+    if exporter is not None and tracer.enabled:
+        exporter.export(tracer)
+    return tracer
+
+
+@contextmanager
+def scope(name, enabled=True, exporter=None, **meta):
+    """Span ``name`` in the active trace, or in a trace of its own when none is active.
+
+    Streamlit fragments rerun on their own; their spans then form a separate
+    run, exported when the fragment finishes.
+    """
+    tracer = _active.get()
+    if tracer.enabled or not enabled:
+        with tracer.span(name) as record:
+            yield record
+        return
+    tracer = begin(True, **meta)
+    try:
+        with tracer.span(name) as record:
+            yield record
+    finally:
+        end(tracer, exporter)
+
+
+# ---------- export ----------
+class SpanExporter:
+    """Append runs to ``*.jsonl``; keep Prometheus histograms in any other path.
+
+    Histograms are per process; put ``{pid}`` in the path when several
+    server processes export to the same directory.
+    """
+
+    def __init__(self, path, buckets=BUCKETS):
+        self.path = Path(str(path).format(pid=os.getpid()))
+        self.format = "jsonl" if self.path.suffix in (".jsonl", ".ndjson") else "prometheus"
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._hist = {}      # stage -> [bucket counts..., +Inf count, sum seconds]
+        self._cache = {}     # (stage, result) -> count
+
+    def export(self, tracer):
+        with self._lock:
+            if self.format == "jsonl":
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a") as fh:
+                    fh.write(json.dumps(tracer.to_dict(), default=str) + "\n")
+                return
+            for s in tracer.spans:
+                self._observe(s["name"], s.get("ms", 0.0)/1e3)
+                if "cache" in s:
+                    key = (s["name"], s["cache"])
+                    self._cache[key] = self._cache.get(key, 0) + 1
+            self._observe("rerun", tracer.total_ms/1e3)
+            self._write(self.prometheus())
+
+    def _observe(self, stage, seconds):
+        h = self._hist.setdefault(stage, [0]*(len(self.buckets) + 1) + [0.0])
+        for i, le in enumerate(self.buckets):
+            if seconds <= le:
+                h[i] += 1
+        h[len(self.buckets)] += 1
+        h[-1] += seconds
+
+    def prometheus(self):
+        lines = ["# HELP dashboard_stage_seconds Wall time of a dashboard rerun stage.",
+                 "# TYPE dashboard_stage_seconds histogram"]
+        for stage, h in sorted(self._hist.items()):
+            for le, count in zip(self.buckets, h):
+                lines.append(f'dashboard_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {count}')
+            lines.append(f'dashboard_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h[len(self.buckets)]}')
+            lines.append(f'dashboard_stage_seconds_sum{{stage="{stage}"}} {h[-1]:.6f}')
+            lines.append(f'dashboard_stage_seconds_count{{stage="{stage}"}} {h[len(self.buckets)]}')
+        lines += ["# HELP dashboard_stage_cache_total Stage cache lookups by result.",
+                  "# TYPE dashboard_stage_cache_total counter"]
+        for (stage, result), count in sorted(self._cache.items()):
+            lines.append(f'dashboard_stage_cache_total{{stage="{stage}",result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def _write(self, text):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(text)
+        os.replace(tmp, self.path)
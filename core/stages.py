@@ -0,0 +1,48 @@
+"""Dependency graph between dashboard inputs and computed stages.
+
+Each stage lists the inputs it reads directly and the stages it builds on.
+``stage_inputs`` resolves the transitive set, so a stage can be memoized on
+exactly the inputs that affect it. Widgets that live inside a stage's own
+fragment (such as the buyer mode radio) are not listed: they rerun only that
+fragment.
+"""
+
+# stage -> (own inputs, upstream stages)
+STAGES = {
+    "snapshot": (("bedrooms",), ()),
+    "cap_gap": (("deposit_pct", "interest", "max_monthly"), ("snapshot",)),
+    "maps": (("metric", "use_real_geo", "focus", "level", "stat"), ("snapshot", "cap_gap")),
+    "table": (("selection",), ("snapshot", "cap_gap")),
+    "buyer": (("segment", "focus", "income", "deposit_pct", "interest", "mortgage_years",
+               "max_monthly"), ("snapshot",)),
+    "sensitivity": (("segment", "focus", "income", "deposit_pct", "interest", "mortgage_years",
+                     "max_monthly"), ("snapshot",)),
+    "trends": (("segment", "preset", "selection", "level", "stat"), ("snapshot",)),
+    "finder": (("segment", "bedrooms", "income", "savings", "deposit_pct", "interest",
+                "mortgage_years", "max_monthly"), ()),
+}
+
+# edges that only exist for some input values: (stage, upstream) -> predicate
+CONDITIONAL = {
+    ("maps", "cap_gap"): lambda v: v.get("metric") == "Payment Cap Gap",
+}
+
+
+def stage_inputs(stage, values=None):
+    """Sorted input names ``stage`` depends on, given current input ``values``.
+
+    Without ``values`` every conditional edge is assumed live.
+    """
+    own, upstream = STAGES[stage]
+    names = set(own)
+    for up in upstream:
+        cond = CONDITIONAL.get((stage, up))
+        if cond is None or values is None or cond(values):
+            names |= set(stage_inputs(up, values))
+    return tuple(sorted(names))
+
+
+def stage_args(stage, values):
+    """The subset of ``values`` that ``stage`` is keyed on."""
+    return {k: values[k] for k in stage_inputs(stage, values)}
+
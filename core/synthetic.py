@@ -0,0 +1,147 @@
+"""Synthetic SA2 price/rent/income panel.
+
+The generator draws from one mulberry32 stream in a fixed order (6 draws per
+SA2 for the starting levels and growth rates, then 6 draws per period).
+mulberry32's state is a plain counter, so draw ``k`` can be computed directly
+from ``k`` and the whole stream is evaluated as one array; the growth
+recurrences are then cumulative products across the period axis.
+"""
+import math
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+SEED = 20250926
+START = date(2015, 1, 1)
+END = date(2025, 9, 1)
+DRAWS_INIT = 6
+DRAWS_STEP = 6
+PERIODS_PER_YEAR = {"M": 12, "W": 52}
+
+_M32 = np.uint64(0xFFFFFFFF)
+_STEP = 0x6D2B79F5
+
+
+def mulberry32(seed: int):
+    a = seed & 0xFFFFFFFF
+    def rnd():
+        nonlocal a
+        a = (a + 0x6D2B79F5) & 0xFFFFFFFF
+        t = (a ^ (a >> 15)) * (1 | a)
+        t = (t + ((t ^ (t >> 7)) * (61 | t))) ^ t
+        return ((t ^ (t >> 14)) & 0xFFFFFFFF) / 4294967296
+    return rnd
+
+
+def mulberry32_array(seed: int, n: int, offset: int = 0) -> np.ndarray:
+    """Draws ``offset .. offset+n-1`` of ``mulberry32(seed)`` as float64.
+
+    Only bits 0..45 of the intermediate ``t`` reach the output, so wrapping
+    uint64 arithmetic reproduces Python's unbounded ints exactly.
+    """
+    k = np.arange(offset + 1, offset + n + 1, dtype=np.uint64)
+    a = (np.uint64(seed & 0xFFFFFFFF) + k * np.uint64(_STEP)) & _M32
+    t = (a ^ (a >> np.uint64(15))) * (np.uint64(1) | a)
+    t = (t + ((t ^ (t >> np.uint64(7))) * (np.uint64(61) | t))) ^ t
+    return ((t ^ (t >> np.uint64(14))) & _M32).astype(np.float64) / 4294967296
+
+
+def range_months(start: date, end: date):
+    months = []
+    y, m = start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        months.append(date(y, m, 1))
+        m += 1
+        if m == 13:
+            m = 1; y += 1
+    return months
+
+
+def range_weeks(start: date, end: date):
+    n = (end - start).days // 7 + 1
+    return [start + timedelta(weeks=i) for i in range(max(0, n))]
+
+
+def sa2_codes(n_sa2: int):
+    width = max(2, len(str(n_sa2)))
+    return [f"SA2_{i:0{width}d}" for i in range(1, n_sa2 + 1)]
+
+
+def grid_layout(codes):
+    """Row-major positions on a roughly 4:3 grid (3x4 for 12 SA2s)."""
+    n = len(codes)
+    ncols = max(1, math.ceil(math.sqrt(n * 4 / 3)))
+    idx = np.arange(n)
+    return pd.DataFrame({"SA2_CODE": list(codes), "row": idx // ncols, "col": idx % ncols})
+
+
+def simulate(n_sa2: int = 12, start: date = START, end: date = END,
+             freq: str = "M", seed: int = SEED):
+    """Synthetic series as arrays: ``(codes, periods, fields)``.
+
+    ``fields`` maps each panel column to an ``(n_sa2, n_periods)`` float64
+    array. Growth rates and noise are calibrated per month and scaled to the
+    period length; the default arguments reproduce the original per-row
+    generator bit for bit.
+    """
+    if freq not in PERIODS_PER_YEAR:
+        raise ValueError(f"freq must be one of {sorted(PERIODS_PER_YEAR)}, got {freq!r}")
+    ppy = PERIODS_PER_YEAR[freq]
+    periods = range_months(start, end) if freq == "M" else range_weeks(start, end)
+    codes = sa2_codes(n_sa2)
+    T = len(periods)
+    scale = 12.0 / ppy
+
+    per_sa2 = DRAWS_INIT + DRAWS_STEP * T
+    r = mulberry32_array(seed, n_sa2 * per_sa2).reshape(n_sa2, per_sa2)
+    init = r[:, :DRAWS_INIT]
+    steps = r[:, DRAWS_INIT:].reshape(n_sa2, T, DRAWS_STEP)
+
+    price0 = 650000 + init[:, 0]*950000
+    rent0 = 420 + init[:, 1]*480
+    income0 = 70000 + init[:, 2]*55000
+    gp = (0.0018 + (init[:, 3]-0.5)*0.0008) * scale
+    gr = (0.0012 + (init[:, 4]-0.5)*0.0006) * scale
+    gi = (0.0009 + (init[:, 5]-0.5)*0.0005) * scale
+
+    def level(x0, g, u, amp, cap):
+        f = 1 + g[:, None] + np.clip((u-0.5)*amp*scale, -cap*scale, cap*scale)
+        # cumprod multiplies left to right, matching the scalar `x *= f` loop
+        return np.cumprod(np.concatenate([x0[:, None], f], axis=1), axis=1)[:, 1:]
+
+    price = level(price0, gp, steps[:, :, 0], 0.002, 0.003)
+    rent = level(rent0, gr, steps[:, :, 1], 0.0016, 0.002)
+    income = level(income0, gi, steps[:, :, 2], 0.0012, 0.0015)
+
+    # math.sin on the handful of distinct phases keeps libm-identical values
+    seas_cycle = np.array([1 + 0.02*math.sin(2*math.pi*p/ppy) for p in range(ppy)])
+    seas = seas_cycle[np.arange(T) % ppy]
+    fields = {
+        "MedianPrice": np.maximum(250000, price*seas + (steps[:, :, 3]-0.5)*24000),
+        "MedianRent_week": np.maximum(250, rent*seas + (steps[:, :, 4]-0.5)*16),
+        "MedianIncome_annual": np.maximum(40000, income*(0.995+(steps[:, :, 5]-0.5)*0.004)),
+    }
+    return codes, periods, fields
+
+
+def period_labels(periods, freq: str = "M"):
+    fmt = "%Y-%m" if freq == "M" else "%Y-%m-%d"
+    return [d.strftime(fmt) for d in periods]
+
+
+def generate_panel(n_sa2: int = 12, start: date = START, end: date = END,
+                   freq: str = "M", seed: int = SEED):
+    """Synthetic long panel ``(df, grid, periods)``; see :func:`simulate`.
+
+    ``freq`` is ``"M"`` (dates as ``YYYY-MM``) or ``"W"`` (``YYYY-MM-DD``).
+    """
+    codes, periods, fields = simulate(n_sa2, start, end, freq, seed)
+    T = len(periods)
+    labels = np.array(period_labels(periods, freq), dtype=object)
+    df = pd.DataFrame({
+        "date": np.tile(labels, n_sa2),
+        "SA2_CODE": np.repeat(np.array(codes, dtype=object), T),
+        **{k: v.ravel() for k, v in fields.items()},
+    })
+    return df, grid_layout(codes), periods
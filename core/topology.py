@@ -0,0 +1,193 @@
+"""Shared-arc topology, level-of-detail simplification and quantized output.
+
+Polygon rings are quantized to a ``QUANTUM``-degree integer grid and cut into
+arcs at junctions (points where the neighbouring rings change), and each
+shared boundary is stored once. Arcs are simplified with Douglas-Peucker
+at every tolerance in ``LOD_TOLERANCES`` with their end points pinned, so
+neighbouring polygons stay watertight at every level. Output is ordinary
+GeoJSON (what Plotly consumes) with coordinates rounded to the quantum.
+"""
+from bisect import bisect_left
+
+import numpy as np
+
+QUANTUM = 1e-5                                   # degrees, ~1 m; matches ABS geometryPrecision=5
+DECIMALS = 5
+LOD_TOLERANCES = (0.0, 0.0002, 0.001, 0.004)     # degrees, finest first
+LOD_FEATURE_LIMITS = (40, 150, 600)              # up to n features -> level i, beyond -> last level
+
+
+def level_for(n_features):
+    """Coarser levels for maps that show more polygons."""
+    return bisect_left(LOD_FEATURE_LIMITS, n_features)
+
+
+def _polygons(geometry):
+    gtype = (geometry or {}).get("type")
+    if gtype == "Polygon":
+        return [geometry["coordinates"]]
+    if gtype == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+def _open_ring(coords):
+    """Quantized ring without consecutive duplicates or the closing point."""
+    q = np.rint(np.asarray(coords, dtype=float)[:, :2] / QUANTUM).astype(np.int64)
+    q = q[np.r_[True, np.any(q[1:] != q[:-1], axis=1)]]
+    if len(q) > 1 and np.array_equal(q[0], q[-1]):
+        q = q[:-1]
+    return q
+
+
+def _douglas_peucker(pts, tol):
+    """Keep end points and the farthest interior point; drop points within ``tol``."""
+    n = len(pts)
+    if n <= 2:
+        return pts
+    p = pts.astype(float)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack, first = [(0, n-1)], True
+    while stack:
+        i, j = stack.pop()
+        if j <= i+1:
+            continue
+        seg, a, b = p[i+1:j], p[i], p[j]
+        ab = b - a
+        norm = np.hypot(*ab)
+        if norm == 0:
+            d = np.hypot(*(seg - a).T)
+        else:
+            d = np.abs(ab[0]*(seg[:, 1]-a[1]) - ab[1]*(seg[:, 0]-a[0])) / norm
+        k = int(np.argmax(d))
+        # the first split is unconditional so closed or two-arc rings never collapse
+        if first or d[k] > tol:
+            keep[i+1+k] = True
+            stack += [(i, i+1+k), (i+1+k, j)]
+        first = False
+    return pts[keep]
+
+
+class Topology:
+    """Polygons as signed references into a list of unique quantized arcs.
+
+    ``shapes[f]`` is a list of polygons, each a list of rings, each a list of
+    arc refs (``i`` for arc ``i``, ``~i`` for arc ``i`` reversed).
+    """
+
+    def __init__(self, arcs, shapes, properties, raw_vertices=0):
+        self.arcs = arcs
+        self.shapes = shapes
+        self.properties = properties
+        self.raw_vertices = raw_vertices
+        self._levels = {0: arcs}
+        self._features = {}     # level -> every feature
+
+    @classmethod
+    def from_geojson(cls, gj):
+        feats = gj["features"]
+        properties = [dict(f.get("properties") or {}) for f in feats]
+        rings = []   # (feature, polygon, open ring)
+        for fi, f in enumerate(feats):
+            for pi, poly in enumerate(_polygons(f.get("geometry"))):
+                for coords in poly:
+                    q = _open_ring(coords)
+                    if len(q) >= 3:
+                        rings.append((fi, pi, q))
+        raw_vertices = sum(len(q) + 1 for _, _, q in rings)
+        junctions = cls._junctions([q for _, _, q in rings])
+
+        arcs, index = [], {}
+        def ref(arc):
+            key = arc.tobytes()
+            if key in index:
+                return index[key]
+            rkey = arc[::-1].tobytes()
+            if rkey in index:
+                return ~index[rkey]
+            index[key] = len(arcs)
+            arcs.append(arc)
+            return index[key]
+
+        shapes = [[] for _ in feats]
+        polys = {}
+        for fi, pi, q in rings:
+            j = np.flatnonzero(junctions(q))
+            if j.size == 0:
+                # isolated ring: one closed arc, rotated to a canonical start for dedup
+                s = int(np.lexsort((q[:, 1], q[:, 0]))[0])
+                q = np.roll(q, -s, axis=0)
+                refs = [ref(np.vstack([q, q[:1]]))]
+            else:
+                q = np.roll(q, -int(j[0]), axis=0)
+                cuts = list(j - j[0]) + [len(q)]
+                q = np.vstack([q, q[:1]])
+                refs = [ref(q[a:b+1]) for a, b in zip(cuts[:-1], cuts[1:])]
+            if (fi, pi) not in polys:
+                polys[(fi, pi)] = []
+                shapes[fi].append(polys[(fi, pi)])
+            polys[(fi, pi)].append(refs)
+        return cls(arcs, shapes, properties, raw_vertices)
+
+    @staticmethod
+    def _junctions(rings):
+        """Predicate marking ring points whose neighbour pair differs between occurrences."""
+        if not rings:
+            return lambda q: np.zeros(len(q), dtype=bool)
+        pts = np.vstack(rings)
+        lo = pts.min(axis=0)
+        span = int(pts[:, 1].max() - lo[1]) + 1
+        def keys(a):
+            return (a[:, 0] - lo[0]) * span + (a[:, 1] - lo[1])
+        k = np.concatenate([keys(q) for q in rings])
+        prev = np.concatenate([keys(np.roll(q, 1, axis=0)) for q in rings])
+        nxt = np.concatenate([keys(np.roll(q, -1, axis=0)) for q in rings])
+        a, b = np.minimum(prev, nxt), np.maximum(prev, nxt)
+        uniq = np.unique(np.stack([k, a, b], axis=1), axis=0)
+        pk, counts = np.unique(uniq[:, 0], return_counts=True)
+        jkeys = pk[counts > 1]
+        return lambda q: np.isin(keys(q), jkeys)
+
+    # ---------- levels of detail ----------
+    def level_arcs(self, level):
+        if level not in self._levels:
+            tol = LOD_TOLERANCES[level] / QUANTUM
+            self._levels[level] = [_douglas_peucker(a, tol) for a in self.arcs]
+        return self._levels[level]
+
+    def _ring(self, arcs, refs):
+        parts = [arcs[r] if r >= 0 else arcs[~r][::-1] for r in refs]
+        ring = np.vstack([parts[0]] + [p[1:] for p in parts[1:]])
+        return np.round(ring * QUANTUM, DECIMALS).tolist()
+
+    def features(self, level=0):
+        """Every feature at ``level``, built once per level."""
+        if level not in self._features:
+            arcs = self.level_arcs(level)
+            feats = []
+            for i, shape in enumerate(self.shapes):
+                polys = [[self._ring(arcs, refs) for refs in poly] for poly in shape]
+                geom = ({"type": "Polygon", "coordinates": polys[0]} if len(polys) == 1
+                        else {"type": "MultiPolygon", "coordinates": polys})
+                feats.append({"type": "Feature", "properties": self.properties[i], "geometry": geom})
+            self._features[level] = feats
+        return self._features[level]
+
+    def to_geojson(self, level=0, indices=None):
+        """FeatureCollection at ``level`` for the features in ``indices`` (all by default).
+
+        Subsets share the level's feature dicts, so any selection costs only
+        a list of references.
+        """
+        feats = self.features(level)
+        return {"type": "FeatureCollection",
+                "features": feats if indices is None else [feats[i] for i in indices]}
+
+    def stats(self):
+        return {
+            "features": len(self.shapes),
+            "arcs": len(self.arcs),
+            "raw_vertices": self.raw_vertices,
+            "level_vertices": [sum(len(a) for a in self.level_arcs(l)) for l in range(len(LOD_TOLERANCES))],
+        }
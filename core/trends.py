@@ -0,0 +1,117 @@
+"""Precomputed trend series for the Trends charts.
+
+For one bedroom setting every derived series (weekly and monthly rent,
+price, PTI, RTI) and its city-wide median per period are computed once over
+the whole cube; any (series, period, selection) request is then a slice.
+"""
+import numpy as np
+import pandas as pd
+
+from .metrics import RENT_BEDROOM_COEFFS
+
+SERIES = ("Rent", "RentMonthly", "Price", "PTI", "RTI")
+
+
+class TrendStore:
+    """``(n_sa2, n_periods)`` arrays per series plus their per-period medians.
+
+    ``median`` supplies the city medians when ``cube`` holds only part of
+    the city (e.g. one chunk of a batch report).
+    """
+
+    def __init__(self, cube, bedrooms, median=None):
+        self.cube = cube
+        self.bedrooms = bedrooms
+        RENT = RENT_BEDROOM_COEFFS.get(bedrooms, 1.0)
+        price = cube.series("MedianPrice")
+        income = cube.series("MedianIncome_annual")
+        rent = cube.series("MedianRent_week")*RENT
+        self.series = {
+            "Rent": rent,
+            "RentMonthly": rent*52/12,
+            "Price": price,
+            "PTI": price/income,
+            "RTI": (rent*52)/income,
+        }
+        self.median = median or {k: np.nanmedian(v, axis=0) for k, v in self.series.items()}
+
+
+    def frame(self, series_key, preset="Max", selection=()):
+        """``date``, ``median`` and one column per selected SA2, oldest period first.
+
+        An empty selection shows the first SA2; unknown codes give NaN columns.
+        """
+        start = self.cube.preset_start(preset)
+        codes = list(selection) or self.cube.codes[:1]
+        ids = self.cube.ids(codes)
+        data = self.series[series_key]
+        out = {"date": self.cube.labels[start:], "median": self.median[series_key][start:]}
+        for code, i in zip(codes, ids):
+            out[code] = data[i, start:] if i >= 0 else np.full(len(out["date"]), np.nan)
+        return pd.DataFrame(out)
+
+    def region_frame(self, rollups, series_key, level, stat="median", preset="Max", regions=()):
+        """:meth:`frame` with one column per region at ``level`` (``core.rollup.Rollups``).
+
+        The ``median`` column stays the city median over SA2s.
+        """
+        start = self.cube.preset_start(preset)
+        data = rollups.series(series_key, level, stat, self.bedrooms, start)
+        ids = pd.Index(rollups.regions(level)).get_indexer(list(regions))
+        out = {"date": self.cube.labels[start:], "median": self.median[series_key][start:]}
+        for code, i in zip(regions, ids):
+            out[code] = data[i] if i >= 0 else np.full(len(out["date"]), np.nan)
+        return pd.DataFrame(out)
+
+
+# ---------- decimation for drawing ----------
+def lttb(y, n_out):
+    """Indices Largest-Triangle-Three-Buckets keeps for each row of ``y``.
+
+    ``y`` is ``(n_series, n)`` on a shared, evenly spaced x; the result is
+    ``(n_series, min(n, n_out))``, always including the first and last
+    point. Rows are decimated together, one vectorized step per bucket.
+    NaN points are only picked from buckets that hold nothing else.
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    S, n = y.shape
+    if n_out >= n:
+        return np.broadcast_to(np.arange(n), (S, n))
+    if n_out < 3:
+        return np.tile(np.array([0, n-1][:max(n_out, 1)]), (S, 1))
+    edges = (np.arange(n_out - 1)*(n - 2)/(n_out - 2)).astype(np.int64) + 1   # n_out-2 buckets over 1..n-2
+    edges[-1] = n - 1
+    out = np.empty((S, n_out), dtype=np.int64)
+    out[:, 0], out[:, -1] = 0, n - 1
+    rows = np.arange(S)
+    a = np.zeros(S, dtype=np.int64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for i in range(n_out - 2):
+            lo, hi = edges[i], edges[i+1]
+            nxt_lo, nxt_hi = hi, edges[i+2] if i + 2 < len(edges) else n
+            cx = (nxt_lo + nxt_hi - 1)/2
+            nxt = y[:, nxt_lo:nxt_hi]
+            cy = np.nansum(nxt, axis=1) / (~np.isnan(nxt)).sum(axis=1)   # NaN when all missing
+            bx = np.arange(lo, hi)
+            by = y[:, lo:hi]
+            ax, ay = a[:, None], y[rows, a][:, None]
+            area = np.abs((ax - cx)*(by - ay) - (ax - bx)*(cy[:, None] - ay))
+            area = np.where(np.isnan(area), np.where(np.isnan(by), -np.inf, -1.0), area)
+            a = lo + np.argmax(area, axis=1)
+            out[:, i+1] = a
+    return out
+
+
+def envelope(y, n_out):
+    """``(starts, low, high)``: the min/max across rows of ``y``, per bucket of at most ``n_out``.
+
+    Bucket extremes are exact, so decimating never narrows the band; NaNs
+    are ignored.
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    low, high = np.fmin.reduce(y, axis=0), np.fmax.reduce(y, axis=0)
+    n = y.shape[1]
+    if n <= n_out:
+        return np.arange(n), low, high
+    starts = np.unique((np.arange(n_out)*n/n_out).astype(np.int64))
+    return starts, np.fmin.reduceat(low, starts), np.fmax.reduceat(high, starts)
@@ -0,0 +1,187 @@
+# figures.py — Plotly figure builders used by app.py
+# Plotly is imported inside the builders, so importing this module (or core) stays cheap.
+import numpy as np
+
+
+def color_scale_gyr(invert=False):
+    scale = [
+        [0.0, "rgb(0,128,0)"],
+        [0.5, "rgb(255,215,0)"],
+        [1.0, "rgb(220,20,60)"]
+    ]
+    return [[1.0-p, c] for p, c in reversed(scale)] if invert else scale
+
+
+# ---------- maps ----------
+GRID_LABEL_MAX = 200  # above this many cells, codes only show on hover
+
+def grid_code_at(grid, x, y):
+    """SA2 code of the grid cell at heatmap coordinates ``(x=col, y=row)``."""
+    hit = grid[(grid["col"] == round(x)) & (grid["row"] == round(y))]
+    return hit["SA2_CODE"].iloc[0] if not hit.empty else None
+
+def map_grid_fig(grid, vals, metric, vmin, vmax, higher_is_bad, focus_sa2, regions=None):
+    """All cells as one heatmap trace; the focus cell is a single outline shape.
+
+    ``regions`` (one code per cell) names the region a cell's value belongs to.
+    """
+    import plotly.graph_objects as go
+    rows, cols = grid["row"].to_numpy(), grid["col"].to_numpy()
+    nrows, ncols = int(rows.max())+1, int(cols.max())+1
+    codes = grid["SA2_CODE"].to_numpy(dtype=object)
+    vals = np.asarray(vals, dtype=float)
+
+    z = np.full((nrows, ncols), np.nan)
+    z[rows, cols] = vals
+    text = np.full((nrows, ncols), "", dtype=object)
+    text[rows, cols] = codes
+    hover = np.full((nrows, ncols), "", dtype=object)
+    names = codes if regions is None else [f"{r} ({c})" for r, c in zip(regions, codes)]
+    hover[rows, cols] = [f"{c} — {metric}: {v:.3g}" for c, v in zip(names, vals)]
+
+    fig = go.Figure(go.Heatmap(
+        z=z, x=np.arange(ncols), y=np.arange(nrows), text=text, hovertext=hover,
+        hoverinfo="text", texttemplate="%{text}" if len(codes) <= GRID_LABEL_MAX else None,
+        colorscale=color_scale_gyr(not higher_is_bad), zmin=vmin, zmax=vmax if vmax > vmin else vmin+1e-9,
+        xgap=4, ygap=4, showscale=False,
+    ))
+    hit = np.flatnonzero(codes == focus_sa2)
+    if hit.size:
+        r, c = rows[hit[0]], cols[hit[0]]
+        fig.add_shape(type="rect", x0=c-0.5, x1=c+0.5, y0=r-0.5, y1=r+0.5,
+                      line=dict(color="#111", width=3))
+    fig.update_xaxes(visible=False, range=[-0.5, ncols-0.5])
+    fig.update_yaxes(visible=False, range=[nrows-0.5, -0.5])
+    fig.update_layout(height=360, margin=dict(l=10,r=10,t=10,b=10),
+                      plot_bgcolor="white", paper_bgcolor="white",
+                      showlegend=False)
+    return fig
+
+
+def tag_features(feats, codes):
+    """FeatureCollection of ``feats`` tied one-to-one to ``codes`` via ``properties.loc_code``."""
+    n = min(len(codes), len(feats))
+    return {"type": "FeatureCollection",
+            "features": [{**f, "properties": {**f.get("properties", {}), "loc_code": codes[i]}}
+                         for i, f in enumerate(feats[:n])]}
+
+
+def map_real_fig(feats, codes, vals_by_code, metric, vmin, vmax, higher_is_bad,
+                 regions=None, region_level=None):
+    """Choropleth of ``feats`` keyed by ``codes``.
+
+    ``regions`` (one code per SA2, at ``region_level``) adds the region to
+    the hover text.
+    """
+    import plotly.graph_objects as go
+    codes = list(codes)[:min(len(codes), len(feats))]
+    # the trace and layout plotly.express.choropleth would emit, without importing express
+    hover = "SA2_CODE=%{location}<br>val=%{z}<extra></extra>"
+    extra = {}
+    if regions is not None:
+        extra["customdata"] = list(regions)[:len(codes)]
+        hover = f"{region_level}=%{{customdata}}<br>" + hover
+    fig = go.Figure(go.Choropleth(
+        geojson=tag_features(feats, codes),
+        locations=codes, z=np.array([vals_by_code.get(c, np.nan) for c in codes], dtype=float),
+        featureidkey="properties.loc_code", coloraxis="coloraxis", geo="geo", name="",
+        hovertemplate=hover, **extra,
+    ))
+    fig.update_geos(domain=dict(x=[0.0, 1.0], y=[0.0, 1.0]), projection_type="mercator",
+                    fitbounds="geojson", visible=False)
+    fig.update_layout(
+        height=520, margin=dict(l=0,r=0,t=0,b=0), legend_tracegroupgap=0,
+        coloraxis=dict(colorscale=color_scale_gyr(not higher_is_bad), cmin=vmin, cmax=vmax,
+                       autocolorscale=False, colorbar=dict(title=metric)),
+    )
+    return fig
+
+
+# ---------- time series ----------
+# stress bands for ts_fig thresholds: (low, high, colour)
+RTI_BANDS = ((0,0.25,"green"),(0.25,0.30,"gold"),(0.30,1.0,"crimson"))
+PTI_BANDS = ((0,8,"green"),(8,10,"gold"),(10,99,"crimson"))
+
+def ts_fig(data, title, thresholds=None, max_points=None, webgl=False, lines=True, band=False):
+    """One line per SA2 column of ``data`` plus the city median.
+
+    ``max_points`` decimates each line (LTTB) and the band (bucket min/max)
+    to at most that many points; ``webgl`` draws with Scattergl. ``band``
+    adds the min-max envelope of the SA2 columns, ``lines=False`` leaves
+    out their individual lines.
+    """
+    import plotly.graph_objects as go
+    from core.trends import envelope, lttb
+    Scatter = go.Scattergl if webgl else go.Scatter
+    fig = go.Figure()
+    if thresholds:
+        for (y1,y2,color) in thresholds:
+            fig.add_shape(type="rect", xref="paper", x0=0, x1=1, y0=y1, y1=y2,
+                          fillcolor=color, opacity=0.12, layer="below", line_width=0)
+    x = data["date"]
+    cols = [c for c in data.columns if c not in ("date","median")]
+    decimate = max_points is not None and len(data) > max_points
+    def points(cols):
+        if not decimate:
+            return [(x, data[c]) for c in cols]
+        ys = data[cols].to_numpy(dtype=float).T
+        return [(x.to_numpy()[i], y[i]) for y, i in zip(ys, lttb(ys, max_points))]
+    if band and cols:
+        starts, low, high = envelope(data[cols].to_numpy(dtype=float).T, max_points or len(data))
+        xs = x.to_numpy()[starts]
+        fig.add_trace(Scatter(x=xs, y=low, mode="lines", line=dict(width=0), hoverinfo="skip", showlegend=False))
+        fig.add_trace(Scatter(x=xs, y=high, mode="lines", line=dict(width=0), hoverinfo="skip",
+                              fill="tonexty", fillcolor="rgba(31,119,180,0.25)",
+                              name=f"Selection min–max ({len(cols)})"))
+    if lines:
+        for col, (xs, y) in zip(cols, points(cols)):
+            fig.add_trace(Scatter(x=xs, y=y, name=col, mode="lines", line=dict(width=1.5)))
+    (xs, y), = points(["median"])
+    fig.add_trace(Scatter(x=xs, y=y, name="Median (city)", mode="lines", line=dict(color="black", width=3)))
+    fig.update_layout(title=title, height=340, margin=dict(l=10,r=10,t=40,b=10))
+    return fig
+
+
+# ---------- affordability sensitivity ----------
+def sensitivity_fig(z, x, y, x_title, y_title, title, current=None, fmt=".2f"):
+    """Heatmap of one scenario output; ``current`` marks the sidebar's (x, y) point."""
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Heatmap(
+        z=z, x=x, y=y, colorscale=color_scale_gyr(), colorbar=dict(title=title),
+        hovertemplate=f"{y_title}: %{{y}}<br>{x_title}: %{{x}}<br>{title}: %{{z:{fmt}}}<extra></extra>",
+    ))
+    if current is not None:
+        fig.add_trace(go.Scatter(x=[current[0]], y=[current[1]], mode="markers", hoverinfo="skip",
+                                 marker=dict(symbol="x", size=12, color="black"), showlegend=False))
+    fig.update_layout(height=360, margin=dict(l=10,r=10,t=10,b=10),
+                      xaxis_title=x_title, yaxis_title=y_title)
+    return fig
+
+
+# ---------- affordability finder ----------
+def finder_timeline_fig(data, n_sa2, title):
+    """SA2s within budget per period (``data``: ``date``, ``affordable``)."""
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Scatter(x=data["date"], y=data["affordable"], mode="lines", fill="tozeroy",
+                               line=dict(width=2), hovertemplate="%{x}: %{y} SA2s<extra></extra>"))
+    fig.update_layout(title=title, height=340, margin=dict(l=10,r=10,t=40,b=10),
+                      yaxis=dict(range=[0, max(1, n_sa2)], title="SA2s"))
+    return fig
+
+
+# ---------- serialization (figure cache) ----------
+def fig_to_json(fig):
+    """Figure JSON without the default template, which is re-applied on load.
+
+    The template is most of a small figure's JSON and of the time
+    ``fig_from_json`` spends validating it.
+    """
+    import plotly.io as pio
+    spec = fig.to_plotly_json()
+    spec["layout"].pop("template", None)
+    return pio.to_json(spec, validate=False)
+
+
+def fig_from_json(text):
+    import plotly.io as pio
+    return pio.from_json(text)
@@ -0,0 +1 @@
+"""Batch reports built from the dashboard's headless core."""
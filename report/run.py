@@ -0,0 +1,204 @@
+"""Affordability pack for every SA2 x bedroom count x buyer profile.
+
+    python -m report.run OUT_DIR                                  # synthetic panel, standard profiles
+    python -m report.run OUT_DIR --source data/panel --profiles profiles.json --workers 8
+
+writes
+
+    OUT_DIR/affordability/part-*.parquet   one row per (SA2, bedrooms, profile): comparison-table
+                                           fields, payment, MTI, RTI and payment cap gap
+    OUT_DIR/sa2/<SA2_CODE>.html            per-SA2 page: those rows and the trend charts
+    OUT_DIR/index.html                     share of SA2s within each profile's cap, links
+    OUT_DIR/manifest.json                  source, period, profiles, counts, timing
+
+The panel is read once and the city medians for the trend charts computed
+up front. SA2s are then split into chunks run on a process pool; a worker
+computes, writes and renders its chunk on its own and sends back only
+counts, so throughput grows with the number of workers.
+"""
+import argparse
+import html
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from core.batch import BEDROOMS, PROFILES, cube_rows, load_profiles
+from core.sources import open_source
+from core.trends import TrendStore
+from figures import PTI_BANDS, RTI_BANDS, ts_fig
+
+MTI_STRESS = 0.30    # buyer panel: MTI >= 30% is an elevated burden
+
+# (series, title, bands); bedroom charts take the bedroom count in the title
+CHARTS = (("Price", "Median Price", None), ("PTI", "PTI", PTI_BANDS))
+BEDROOM_CHARTS = (("Rent", "Median Rent ({b}BR, week)", None), ("RTI", "RTI ({b}BR)", RTI_BANDS))
+
+PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>{title}</title>{head}
+<style>body{{font-family:sans-serif;margin:2em}} table{{border-collapse:collapse}}
+td,th{{padding:2px 8px;text-align:right}} .charts{{display:grid;grid-template-columns:1fr 1fr}}</style>
+</head><body><h1>{title}</h1>
+{body}
+</body></html>
+"""
+
+
+# ---------- pages ----------
+def money(x):
+    return "—" if pd.isna(x) else f"A$ {int(round(x)):,.0f}"
+
+
+def pct(x):
+    return "—" if pd.isna(x) else f"{x*100:.1f}%"
+
+
+def results_table(rows):
+    """One SA2's rows formatted like the dashboard's comparison table."""
+    return pd.DataFrame({
+        "Bedrooms": rows["bedrooms"], "Profile": rows["profile"].astype(str),
+        "Median Price": rows["MedianPrice_adj"].map(money),
+        "Median Rent (/wk)": rows["MedianRent_week_adj"].map(money),
+        "PTI": rows["PTI"].map(lambda x: f"{x:.1f}"), "RTI": rows["RTI"].map(pct),
+        "Payment (/mo)": rows["payment"].map(money), "MTI": rows["MTI"].map(pct),
+        "RTI (profile income)": rows["RTI_profile"].map(pct),
+        "Payment Cap Gap": rows["gap"].map(lambda g: ("✅ " if g <= 0 else "❌ ") + pct(g)),
+    }).to_html(index=False, border=0)
+
+
+def chart_specs(cube, medians):
+    """``(series, figure dict)`` per chart, drawn for the chunk's first SA2.
+
+    Charts of one kind differ only in the SA2 trace, so each is built and
+    validated once per chunk and ``chart_html`` swaps in the other SA2s.
+    """
+    stores = {b: TrendStore(cube, b, medians[b]) for b in medians}
+    first = stores[min(stores)]    # price and PTI do not depend on bedrooms
+    charts = [(first, key, title, bands) for key, title, bands in CHARTS]
+    charts += [(stores[b], key, title.format(b=b), bands) for b in stores for key, title, bands in BEDROOM_CHARTS]
+    return [(store.series[key], ts_fig(store.frame(key, "Max", cube.codes[:1]), title, bands).to_plotly_json())
+            for store, key, title, bands in charts]
+
+
+def chart_html(spec, code, y):
+    """``spec`` with its first (SA2) trace showing ``code``'s series ``y``, as an HTML div."""
+    import plotly.io as pio
+    spec = {**spec, "data": [{**spec["data"][0], "name": code, "y": y}, *spec["data"][1:]]}
+    return pio.to_html(spec, include_plotlyjs=False, full_html=False, validate=False)
+
+
+def write_pages(cube, rows, medians, out):
+    """``out/<code>.html`` for every SA2 of ``cube``; charts use the city ``medians``."""
+    specs = chart_specs(cube, medians)
+    groups = rows.groupby("SA2_CODE", sort=False)
+    for i, code in enumerate(cube.codes):
+        charts = "".join(chart_html(spec, code, series[i]) for series, spec in specs)
+        body = (f'<p><a href="../index.html">All SA2s</a></p>{results_table(groups.get_group(code))}'
+                f'<div class="charts">{charts}</div>')
+        (out / f"{code}.html").write_text(PAGE.format(
+            title=html.escape(f"SA2 {code}"), head='<script src="plotly.min.js"></script>', body=body))
+
+
+def index_page(counts, n_sa2, codes, period):
+    shares = (counts/n_sa2).map(pct)
+    links = " ".join(f'<a href="sa2/{html.escape(c)}.html">{html.escape(c)}</a>' for c in codes)
+    body = (f"<p>{n_sa2:,} SA2s at {period}.</p>"
+            f"<h2>Within the payment cap (gap ≤ 0)</h2>{shares['within_cap'].unstack().to_html(border=0)}"
+            f"<h2>MTI below {MTI_STRESS:.0%}</h2>{shares['mti_ok'].unstack().to_html(border=0)}"
+            f"<h2>SA2 pages</h2><p>{links}</p>")
+    return PAGE.format(title="Affordability pack", head="", body=body)
+
+
+# ---------- workers ----------
+_job = {}   # this process's share of the settings, set once per worker
+
+
+def _init(settings):
+    _job.update(settings)
+
+
+def render_chunk(i, cube):
+    """Rows, Parquet part and pages for one chunk; returns ``(i, n_sa2, n_rows, counts)``."""
+    rows = cube_rows(cube, _job["bedrooms"], _job["profiles"], _job["t"])
+    rows.to_parquet(_job["out"] / "affordability" / f"part-{i:05d}.parquet", index=False)
+    if _job["pages"]:
+        write_pages(cube, rows, _job["medians"], _job["out"] / "sa2")
+    counts = rows.assign(within_cap=rows["gap"] <= 0, mti_ok=rows["MTI"] < MTI_STRESS) \
+                 .groupby(["profile", "bedrooms"], observed=True)[["within_cap", "mti_ok"]].sum()
+    return i, len(cube.codes), len(rows), counts
+
+
+def run(cube, out, profiles=PROFILES, bedrooms=BEDROOMS, t=-1, workers=None, chunk_size=None, pages=True):
+    """Write the pack for ``cube`` into ``out``; returns the manifest."""
+    workers = workers or os.cpu_count() or 1
+    n = len(cube.codes)
+    chunk_size = chunk_size or max(1, math.ceil(n / (workers*8)))   # several chunks per worker
+    out = Path(out)
+    (out / "affordability").mkdir(parents=True, exist_ok=True)
+    for stale in (out / "affordability").glob("part-*.parquet"):
+        stale.unlink()
+    settings = {"out": out, "profiles": profiles, "bedrooms": tuple(bedrooms), "t": t, "pages": pages,
+                "medians": {b: TrendStore(cube, b).median for b in bedrooms} if pages else None}
+    if pages:
+        from plotly.offline import get_plotlyjs
+        (out / "sa2").mkdir(exist_ok=True)
+        (out / "sa2" / "plotly.min.js").write_text(get_plotlyjs())
+
+    t0 = time.perf_counter()
+    chunks = [(i, cube.rows(lo, lo + chunk_size)) for i, lo in enumerate(range(0, n, chunk_size))]
+    results = []
+    if workers == 1:
+        _init(settings)
+        results = [render_chunk(i, c) for i, c in chunks]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init, initargs=(settings,)) as pool:
+            futures = [pool.submit(render_chunk, i, c) for i, c in chunks]
+            for done, f in enumerate(as_completed(futures), 1):
+                results.append(f.result())
+                print(f"\rchunks {done}/{len(chunks)}", end="", file=sys.stderr, flush=True)
+            print(file=sys.stderr)
+    seconds = time.perf_counter() - t0
+
+    counts = sum(r[3] for r in results)
+    period = cube.labels[t]
+    if pages:
+        (out / "index.html").write_text(index_page(counts, n, cube.codes, period))
+    manifest = {"period": period, "n_sa2": n, "rows": int(sum(r[2] for r in results)),
+                "bedrooms": list(bedrooms), "profiles": profiles, "workers": workers,
+                "chunks": len(chunks), "chunk_size": chunk_size, "seconds": round(seconds, 3),
+                "sa2_per_second": round(n/seconds, 1) if seconds else None}
+    (out / "manifest.json").write_text(json.dumps(manifest, indent=1))
+    return manifest
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("out", type=Path)
+    ap.add_argument("--source", default=os.environ.get("PANEL_SOURCE", "synthetic"),
+                    help='"synthetic[:N]" or a Parquet/Arrow panel path (default: $PANEL_SOURCE)')
+    ap.add_argument("--profiles", help="JSON file of buyer profiles (default: the standard set)")
+    ap.add_argument("--bedrooms", type=lambda s: tuple(int(x) for x in s.split(",")), default=BEDROOMS)
+    ap.add_argument("--at", help="period YYYY-MM (default: latest)")
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    ap.add_argument("--chunk-size", type=int, default=None, help="SA2s per task")
+    ap.add_argument("--no-html", action="store_true", help="Parquet only")
+    args = ap.parse_args(argv)
+
+    cube = open_source(args.source).cube()
+    if args.at and args.at not in cube.labels:
+        ap.error(f"period {args.at} not in the panel ({cube.labels[0]} .. {cube.labels[-1]})")
+    t = cube.labels.index(args.at) if args.at else -1
+    profiles = load_profiles(args.profiles) if args.profiles else PROFILES
+    m = run(cube, args.out, profiles, args.bedrooms, t, args.workers, args.chunk_size, not args.no_html)
+    print(f"{m['n_sa2']:,} SA2s x {len(m['bedrooms'])} bedroom counts x {len(profiles)} profiles "
+          f"= {m['rows']:,} rows at {m['period']} in {m['seconds']:.1f} s "
+          f"({m['workers']} workers, {m['sa2_per_second']:,} SA2/s) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()